@@ -2,5 +2,4 @@
 
 __version__ = '0.7.0.dev0'
 
-from . import icons
 from .utils import report
@@ -0,0 +1,158 @@
+"""Module about editing the blocksets from the command line without Qt."""
+import argparse
+import copy
+import shlex
+import numpy as np
+from blockbuilder.params import get_params
+from blockbuilder.block import Block, _indices_to_cells
+from blockbuilder.files import read_file, write_file, get_file_data
+
+
+class _Operation(argparse.Action):
+    # the operations are applied in the order of the command line
+    def __call__(self, parser, namespace, values, option_string=None):
+        if self.dest in ("fill", "remove") and len(values) not in (3, 6):
+            parser.error("argument {}: expected the coords of a cell or of "
+                         "the two corners of an area".format(option_string))
+        namespace.operations = namespace.operations + ((self.dest, values),)
+
+
+def get_parser():
+    """Return the parser of the command line."""
+    parser = argparse.ArgumentParser(
+        prog="blockbuilder-batch",
+        description="Edit the blocksets without display. The operations "
+                    "are applied in order, the coords are the ones of the "
+                    "cells and the colors are in [0, 1].",
+    )
+    parser.set_defaults(operations=())
+    parser.add_argument("--dimensions", type=int, nargs=3,
+                        metavar=("X", "Y", "Z"),
+                        help="dimensions of the initial grid of points")
+    parser.add_argument("--storage", choices=["implicit", "explicit",
+                                              "sparse"])
+    parser.add_argument("--color-type", choices=["uint8", "float",
+                                                 "palette"])
+    _add_operations(parser)
+    return parser
+
+
+def _add_operations(parser):
+    parser.add_argument("--merge", action=_Operation, metavar="FILE",
+                        help="merge a blockset, the grid grows to contain it")
+    parser.add_argument("--fill", action=_Operation, type=int, nargs="+",
+                        metavar="X Y Z",
+                        help="add the blocks of a cell or of an area")
+    parser.add_argument("--remove", action=_Operation, type=int, nargs="+",
+                        metavar="X Y Z",
+                        help="remove the blocks of a cell or of an area")
+    parser.add_argument("--color", action=_Operation, type=float, nargs=3,
+                        metavar=("R", "G", "B"),
+                        help="set the color of the next blocks")
+    parser.add_argument("--recolor", action=_Operation, type=float, nargs=3,
+                        metavar=("R", "G", "B"),
+                        help="set the color of all the blocks, or of the "
+                             "material of the current color with a palette")
+    parser.add_argument("--clear", action=_Operation, nargs=0,
+                        help="remove all the blocks")
+    parser.add_argument("--export", action=_Operation, metavar="FILE",
+                        help="export the blockset")
+    parser.add_argument("--script", action=_Operation, metavar="FILE",
+                        help="apply the operations of a file, one per line "
+                             "such as 'fill 0 0 0 3 3 0'")
+
+
+def main(argv=None):
+    """Start BlockBuilder in batch mode and return the final blocks."""
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    params = copy.deepcopy(get_params())
+    if args.dimensions is not None:
+        params["dimensions"] = args.dimensions
+    if args.storage is not None:
+        params["block"]["storage"]["value"] = args.storage
+    if args.color_type is not None:
+        params["block"]["color_type"]["value"] = args.color_type
+    # the edits cannot be undone and the cache of the builder is not shared
+    params["block"]["history_budget"] = 0
+    params["block"]["paging"]["path"] = ""
+    block = Block(params, params["dimensions"])
+    try:
+        block = _apply(parser, params, block, args.operations)
+    except (OSError, ValueError) as error:
+        parser.exit(1, "{}: error: {}\n".format(parser.prog, error))
+    return block
+
+
+def _apply(parser, params, block, operations):
+    for name, values in operations:
+        if name == "merge":
+            block = _merge(params, block, read_file(None, params, values))
+        elif name == "fill":
+            block.add(_get_coords(values))
+        elif name == "remove":
+            block.remove(_get_coords(values))
+        elif name == "color":
+            block.set_color(values)
+        elif name == "recolor":
+            if block.palette is None:
+                block.set_color(values)
+                ids, _ = block.get_visible_cells()
+                block.add_cells(_indices_to_cells(ids, block.dimensions))
+            else:
+                # the materials are kept, only the current one changes
+                block.set_palette_color(block.cell_color, values)
+                block.set_color(values)
+        elif name == "clear":
+            block.remove_all()
+        elif name == "export":
+            write_file(None, get_file_data(block, values), values,
+                       params["blockset"])
+        elif name == "script":
+            block = _apply(parser, params, block, _read_script(parser,
+                                                               values))
+    return block
+
+
+def _merge(params, block, imported_block):
+    # the grid grows to contain the imported blocks like in the builder
+    dimensions = np.max([block.dimensions, imported_block.dimensions],
+                        axis=0)
+    if not np.array_equal(dimensions, block.dimensions):
+        old_block = block
+        block = Block(params, dimensions)
+        block.set_color(old_block.color)
+        block.merge(old_block)
+    block.merge(imported_block)
+    return block
+
+
+def _read_script(parser, filename):
+    # the lines are parsed as the operations of the same name
+    script_parser = argparse.ArgumentParser(prog=parser.prog, add_help=False,
+                                            allow_abbrev=False)
+    script_parser.set_defaults(operations=())
+    _add_operations(script_parser)
+    operations = list()
+    with open(filename) as fp:
+        for number, line in enumerate(fp, start=1):
+            tokens = shlex.split(line, comments=True)
+            if not tokens:
+                continue
+            args, unknown = script_parser.parse_known_args(
+                ["--" + tokens[0]] + tokens[1:])
+            if unknown:
+                parser.error("{}:{}: '{}' is not an operation".format(
+                    filename, number, " ".join(unknown)))
+            operations.extend(args.operations)
+    return operations
+
+
+def _get_coords(values):
+    if len(values) == 3:
+        return values
+    return (values[:3], values[3:])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,27 @@
 """Module about the block element."""
 
+import itertools
+from contextlib import contextmanager
 import numpy as np
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
 from .element import ElementId
-from .utils import get_structured_grid, get_mesh_cell_array
+from .chunk import Chunk, HIDDEN_CELL
+from .surface import get_edge_texture
+from .history import History, get_delta
+from .cache import ChunkCache
+from .utils import (get_structured_grid, get_uniform_grid,
+                    get_mesh_cell_array, get_mesh_ghost_array,
+                    structured_grid_to_uniform_grid,
+                    uniform_grid_to_structured_grid,
+                    image_data_to_uniform_grid)
+
+COLOR_TYPES = {
+    "uint8": np.uint8,
+    "float": np.float64,
+    "palette": np.uint16,
+}
+MAX_MATERIALS = np.iinfo(COLOR_TYPES["palette"]).max + 1
 
 
 class Block(object):
@@ -17,136 +36,885 @@ class Block(object):
         self.unit = self.params["unit"]
         self.origin = np.asarray(self.params["origin"])
         self.color_array_name = self.params["block"]["color_array_name"]
-        self.color = np.asarray(self.params["block"]["color"])
+        self.palette_array_name = self.params["block"]["palette_array_name"]
+        self.color = np.asarray(self.params["block"]["color"],
+                                dtype=np.float64)
         self.edge_color = np.asarray(self.params["block"]["edge"]["color"])
         self.merge_policy = self.params["block"]["merge_policy"]["value"]
+        self.storage = self.params["block"]["storage"]["value"]
+        self.chunk_size = self.params["block"]["chunk_size"]
+        self.greedy_meshing = self.params["block"]["greedy_meshing"]
+        # the merged faces draw the edges of the cells with a texture
+        if self.greedy_meshing:
+            self.edge_texture = get_edge_texture(self.edge_color)
+        else:
+            self.edge_texture = None
+        self.chunks = dict()
+        self.dirty_chunks = set()
+        self.cache = None
+        self.transaction_depth = 0
+        self.pending_update = False
+        self.history = None
+        self.journal = None
+        # the cells tracked for the journal without the history
+        self.tracked = list()
+        # counter of the modifications
+        self.revision = 0
+        self.color_type = self.params["block"]["color_type"]["value"]
+        self.palette = None
+        self.lookup_table = None
+        self.create_actor = None
         # we assume that the input mesh respect the spacing
         self.spacing = np.asarray([self.unit, self.unit, self.unit])
 
         if mesh is None:
             self.dimensions = np.asarray(dimensions)
             self.number_of_cells = int(np.prod(self.dimensions - 1))
-            self.mesh = get_structured_grid(
-                dimensions=self.dimensions,
-                origin=self.origin,
-                spacing=self.spacing,
-                array_name=self.color_array_name,
-                color=self.color,
-            )
-            self.remove_all()
+            self.color_dtype = COLOR_TYPES[self.color_type]
+            self.mesh = self._get_mesh()
+            paging = self.params["block"]["paging"]
+            if self.storage == "sparse" and paging["budget"] > 0:
+                # the chunks that do not fit in the budget are on the disk
+                self.cache = ChunkCache(self, paging["path"],
+                                        budget=paging["budget"] * 2 ** 20)
         else:
+            if isinstance(mesh, vtk.vtkImageData) and \
+               not isinstance(mesh, vtk.vtkUniformGrid):
+                # blanking is supported by vtkUniformGrid only
+                mesh = image_data_to_uniform_grid(mesh)
+            if isinstance(mesh, vtk.vtkUniformGrid):
+                self.storage = "implicit"
+            else:
+                self.storage = "explicit"
             self.dimensions = np.asarray(mesh.GetDimensions())
             self.number_of_cells = int(mesh.GetNumberOfCells())
             self.mesh = mesh
-        self.color_array = get_mesh_cell_array(
-            self.mesh,
-            self.color_array_name
-        )
+        if self.mesh is None:
+            # the sparse storage only keeps the occupied chunks
+            self.color_array = None
+            self.ghost_array = None
+            self.colors = None
+            self.ghosts = None
+            palette_array = None
+        else:
+            self.color_array = get_mesh_cell_array(
+                self.mesh,
+                self.color_array_name
+            )
+            self.ghost_array = get_mesh_ghost_array(self.mesh)
+            # numpy views sharing the memory of the VTK arrays
+            self.colors = vtk_to_numpy(self.color_array)
+            self.ghosts = vtk_to_numpy(self.ghost_array)
+            self.color_dtype = self.colors.dtype
+            palette_array = self.mesh.GetFieldData().GetArray(
+                self.palette_array_name)
+            # an input mesh keeps its own type of colors
+            if self.colors.ndim == 1:
+                self.color_type = "palette"
+            else:
+                self.color_type = _color_type(self.colors)
+        if self.color_type == "palette":
+            self.lookup_table = vtk.vtkLookupTable()
+            if palette_array is None:
+                palette = self.color[np.newaxis]
+            else:
+                palette = vtk_to_numpy(palette_array).reshape(-1, 3)
+            self._set_palette(palette)
+        self.set_color(self.color)
+        if mesh is None:
+            self.remove_all()
+        if self.cache is not None:
+            self._load_cache()
+        # the edits are recorded as deltas of the cells
+        history_budget = self.params["block"]["history_budget"]
+        if history_budget > 0:
+            self.history = History(budget=history_budget * 2 ** 20)
         self.plotting = {
             "mesh": self.mesh,
             "edge_color": self.edge_color,
-            "rgba": True,
+            "rgba": self.palette is None,
+            "lookup_table": self.lookup_table,
         }
 
     def merge(self, block):
         """Merge the input block properties."""
-        color_array = block.color_array
-        for block_cell_id in range(block.number_of_cells):
-            if block.mesh.IsCellVisible(block_cell_id):
-                # get original color
-                block_color = color_array.GetTuple3(block_cell_id)
-                # change coordinates
-                coords = _cell_to_coords(block_cell_id, block.dimensions)
-                cell_id = _coords_to_cell(coords, self.dimensions)
-                if self.mesh.IsCellVisible(cell_id):
-                    if self.merge_policy == "external":
-                        self.color_array.SetTuple3(cell_id, *block_color)
+        # the blocks share the same origin so the overlap is a sub-volume
+        stop = np.minimum(self.dimensions, block.dimensions) - 1
+        if self.storage == "sparse":
+            window_size = self.chunk_size
+        else:
+            window_size = None
+        for start, block_ghosts, block_colors in \
+                block._get_windows(stop, window_size):
+            block_visible = (block_ghosts & HIDDEN_CELL) == 0
+            if not np.any(block_visible):
+                continue
+            window_stop = start + block_ghosts.shape[::-1]
+            self._record_box(start, window_stop)
+            self._mark_dirty(start, window_stop)
+            for region, ghosts, colors in \
+                    self._get_regions(start, window_stop, allocate=True):
+                visible = block_visible[region]
+                if self.merge_policy == "external":
+                    update = visible
                 else:
-                    self.mesh.UnBlankCell(cell_id)
-                    self.color_array.SetTuple3(cell_id, *block_color)
-        self.mesh.Modified()
+                    update = visible & ((ghosts & HIDDEN_CELL) != 0)
+                ghosts[visible] &= ~np.uint8(HIDDEN_CELL)
+                colors[update] = self._merge_colors(
+                    block, block_colors[region][update])
+        self._modified()
+
+    def _merge_colors(self, block, values):
+        if block.palette is not None and self.palette is not None:
+            # remap the used materials instead of the colors of the cells
+            materials, inverse = np.unique(values, return_inverse=True)
+            values = self._get_materials(block.palette[materials])
+            return values[inverse.ravel()]
+        elif block.palette is not None:
+            return _convert_colors(block.palette[values], self.color_type)
+        elif self.palette is not None:
+            return self._get_materials(values)
+        else:
+            return _convert_colors(values, self.color_type)
 
     def add(self, coords):
         """Add the block at the given coords."""
-        if isinstance(coords, tuple):
-            for _coords in _area_to_coords(coords):
-                cell_id = _coords_to_cell(_coords, self.dimensions)
-                if not self.mesh.IsCellVisible(cell_id):
-                    self.mesh.UnBlankCell(cell_id)
-                self.color_array.SetTuple3(
-                    cell_id, *self.color)
-        else:
-            cell_id = _coords_to_cell(coords, self.dimensions)
-            if not self.mesh.IsCellVisible(cell_id):
-                self.mesh.UnBlankCell(cell_id)
-            self.color_array.SetTuple3(
-                cell_id, *self.color)
-        self.mesh.Modified()
+        start, stop = _coords_to_box(coords)
+        self._record_box(start, stop)
+        self._mark_dirty(start, stop)
+        for _, ghosts, colors in self._get_regions(start, stop,
+                                                   allocate=True):
+            ghosts &= ~np.uint8(HIDDEN_CELL)
+            colors[:] = self.cell_color
+        self._modified()
 
     def add_all(self):
         """Add all the blocks."""
-        for cell_id in range(self.number_of_cells):
-            self.mesh.UnBlankCell(cell_id)
-        self.mesh.Modified()
+        if self.storage == "sparse":
+            self.add((np.zeros(3), self.dimensions - 2))
+        else:
+            self._record_box(np.zeros(3), self.dimensions - 1)
+            self.ghosts &= ~np.uint8(HIDDEN_CELL)
+            self.dirty_chunks.update(self.chunks.keys())
+            self._modified()
 
     def remove(self, coords):
         """Remove the block at the given coords."""
-        if isinstance(coords, tuple):
-            for _coords in _area_to_coords(coords):
-                cell_id = _coords_to_cell(_coords, self.dimensions)
-                if self.mesh.IsCellVisible(cell_id):
-                    self.mesh.BlankCell(cell_id)
-                    self.mesh.Modified()
-        else:
-            cell_id = _coords_to_cell(coords, self.dimensions)
-            if self.mesh.IsCellVisible(cell_id):
-                self.mesh.BlankCell(cell_id)
-                self.mesh.Modified()
+        start, stop = _coords_to_box(coords)
+        self._record_box(start, stop)
+        self._mark_dirty(start, stop)
+        for _, ghosts, _ in self._get_regions(start, stop):
+            ghosts |= np.uint8(HIDDEN_CELL)
+        self._modified()
+
+    def add_cells(self, cells):
+        """Add the blocks at each of the given coords at once."""
+        cells = self._clip_cells(cells)
+        ids = _cells_to_indices(cells, self.dimensions)
+        self._record(ids)
+        self._mark_cells_dirty(cells)
+        for ghosts, colors, _, indices in self._get_cells(ids,
+                                                          allocate=True):
+            ghosts[indices] &= ~np.uint8(HIDDEN_CELL)
+            colors[indices] = self.cell_color
+        self._modified()
+
+    def remove_cells(self, cells):
+        """Remove the blocks at each of the given coords at once."""
+        cells = self._clip_cells(cells)
+        ids = _cells_to_indices(cells, self.dimensions)
+        self._record(ids)
+        self._mark_cells_dirty(cells)
+        for ghosts, _, _, indices in self._get_cells(ids):
+            ghosts[indices] |= np.uint8(HIDDEN_CELL)
+        self._modified()
 
     def remove_all(self):
         """Remove all the blocks."""
-        for cell_id in range(self.number_of_cells):
-            self.mesh.BlankCell(cell_id)
-        self.mesh.Modified()
+        if self.storage == "sparse":
+            for index in list(self.chunks.keys()):
+                chunk = self.chunks[index]
+                self._record_box(chunk.start, chunk.stop)
+                self._remove_chunk(index)
+        else:
+            # the hidden cells are not modified
+            self._record(np.flatnonzero((self.ghosts & HIDDEN_CELL) == 0))
+            self.ghosts |= np.uint8(HIDDEN_CELL)
+            self.dirty_chunks.update(self.chunks.keys())
+        self._modified()
+
+    def undo(self):
+        """Revert the last recorded edits, return False if there is none."""
+        if self.history is None:
+            return False
+        self._end_gesture()
+        return self._apply_delta(self.history.undo(), new=False)
+
+    def redo(self):
+        """Apply the last reverted edits, return False if there is none."""
+        if self.history is None:
+            return False
+        self._end_gesture()
+        return self._apply_delta(self.history.redo(), new=True)
+
+    def begin_gesture(self):
+        """Record the next edits as a single entry of the history."""
+        if self.history is not None:
+            self.history.begin()
+
+    def end_gesture(self):
+        """Stop grouping the edits in the history."""
+        if self.history is not None:
+            self.history.end()
+            self._end_gesture()
+
+    def set_cells(self, ids, visible, colors):
+        """Set the cells given by their ids without recording them.
+
+        ``colors`` are the colors of the visible cells only.
+        """
+        self._mark_cells_dirty(_indices_to_cells(ids, self.dimensions))
+        for ghosts, block_colors, positions, indices in \
+                self._get_cells(ids[visible], allocate=True):
+            ghosts[indices] &= ~np.uint8(HIDDEN_CELL)
+            block_colors[indices] = colors[positions]
+        for ghosts, _, _, indices in self._get_cells(ids[~visible]):
+            ghosts[indices] |= np.uint8(HIDDEN_CELL)
+        self._modified()
+
+    def get_visible_cells(self):
+        """Return the ids and the colors of the visible cells."""
+        ids = list()
+        colors = list()
+        nx, ny = self.dimensions[0] - 1, self.dimensions[1] - 1
+        for start, ghosts, window_colors in \
+                self._get_windows(self.dimensions - 1):
+            visible = (ghosts & HIDDEN_CELL) == 0
+            z, y, x = np.nonzero(visible)
+            ids.append(x + start[0] + (y + start[1] + (z + start[2]) * ny)
+                       * nx)
+            colors.append(window_colors[visible])
+        if not ids:
+            return (np.zeros(0, dtype=np.int64),
+                    np.zeros((0,) + np.shape(self.cell_color),
+                             dtype=self.color_dtype))
+        return np.concatenate(ids), np.concatenate(colors)
+
+    def _apply_delta(self, delta, new):
+        if delta is None:
+            return False
+        self.set_cells(*delta.get(new))
+        if self.journal is not None:
+            self.journal.append(delta, new)
+        return True
+
+    def _record(self, ids):
+        # keep the state of the cells before they are modified
+        if self.history is not None:
+            self.history.track(ids, *self._read_cells(ids))
+        elif self.journal is not None and len(ids) > 0:
+            self.tracked.append((ids,) + self._read_cells(ids))
+
+    def _record_box(self, start, stop):
+        if self.history is None and self.journal is None:
+            return
+        start, stop = self._clip_box(start, stop)
+        if np.any(stop <= start):
+            return
+        x, y, z = (np.arange(first, last) for first, last in
+                   zip(start, stop))
+        nx, ny = self.dimensions[0] - 1, self.dimensions[1] - 1
+        ids = x[np.newaxis, np.newaxis] + \
+            (y[np.newaxis, :, np.newaxis] +
+             z[:, np.newaxis, np.newaxis] * ny) * nx
+        self._record(ids.ravel())
+
+    def _end_gesture(self):
+        # the gesture is recorded once all its edits are done
+        if self.transaction_depth > 0:
+            return
+        if self.history is not None:
+            if self.history.grouping:
+                return
+            delta = self.history.commit(self._read_cells)
+        else:
+            # the edits are journaled even if they cannot be undone
+            delta = get_delta(self.tracked, self._read_cells)
+            self.tracked = list()
+        if delta is not None and self.journal is not None:
+            self.journal.append(delta)
+
+    def _read_cells(self, ids):
+        # visibility and colors of the cells
+        if self.storage != "sparse":
+            return (self.ghosts[ids] & HIDDEN_CELL) == 0, self.colors[ids]
+        visible = np.zeros(len(ids), dtype=bool)
+        colors = np.zeros((len(ids),) + np.shape(self.cell_color),
+                          dtype=self.color_dtype)
+        for ghosts, block_colors, positions, indices in self._get_cells(ids):
+            visible[positions] = (ghosts[indices] & HIDDEN_CELL) == 0
+            colors[positions] = block_colors[indices]
+        return visible, colors
+
+    def _get_regions(self, start, stop, allocate=False):
+        # yield the (z, y, x) views of the storage over the cells in
+        # [start, stop) with their region relative to start
+        offset = np.asarray(start, dtype=np.int64)
+        start, stop = self._clip_box(start, stop)
+        if np.any(stop <= start):
+            return
+        if self.storage != "sparse":
+            yield (_box_to_region(start - offset, stop - offset),
+                   _as_grid(self.ghosts, self.dimensions)[
+                       _box_to_region(start, stop)],
+                   _as_grid(self.colors, self.dimensions)[
+                       _box_to_region(start, stop)])
+            return
+        for index in self._get_chunk_indices(start, stop):
+            chunk = self.chunks.get(index)
+            if chunk is None:
+                if not allocate:
+                    continue
+                chunk = self._add_chunk(index)
+            chunk_start = np.maximum(start, chunk.start)
+            chunk_stop = np.minimum(stop, chunk.stop)
+            local_region = _box_to_region(chunk_start - chunk.start,
+                                          chunk_stop - chunk.start)
+            yield (_box_to_region(chunk_start - offset, chunk_stop - offset),
+                   _as_grid(chunk.ghosts, chunk.dimensions)[local_region],
+                   _as_grid(chunk.colors, chunk.dimensions)[local_region])
+
+    def _get_cells(self, ids, allocate=False):
+        # yield the flat arrays of the storage with the positions in ids
+        # of the cells they store and the indices of the cells in them
+        if self.storage != "sparse":
+            yield self.ghosts, self.colors, slice(None), ids
+            return
+        cells = _indices_to_cells(ids, self.dimensions)
+        # the cells are grouped by chunk
+        chunk_cells = cells // self.chunk_size
+        number_of_chunks = -(-(self.dimensions - 1) // self.chunk_size)
+        keys = np.ravel_multi_index(tuple(chunk_cells.T[::-1]),
+                                    tuple(number_of_chunks[::-1]))
+        order = np.argsort(keys, kind="stable")
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for positions in np.split(order, bounds):
+            if len(positions) == 0:
+                continue
+            index = tuple(chunk_cells[positions[0]].tolist())
+            chunk = self.chunks.get(index)
+            if chunk is None:
+                if not allocate:
+                    continue
+                chunk = self._add_chunk(index)
+            local_cells = cells[positions] - chunk.start
+            yield (chunk.ghosts, chunk.colors, positions,
+                   _cells_to_indices(local_cells, chunk.dimensions))
+
+    def _clip_cells(self, cells):
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        inside = np.all((cells >= 0) & (cells < self.dimensions - 1), axis=1)
+        return cells[inside]
+
+    def _mark_cells_dirty(self, cells):
+        # same as _mark_dirty but for independent cells, only the cells on
+        # the border of their chunk modify the surface of a neighbor
+        number_of_chunks = -(-(self.dimensions - 1) // self.chunk_size)
+        # the chunks are flagged in a grid padded by one chunk
+        dirty = np.zeros(number_of_chunks + 2, dtype=bool)
+        chunk_cells = cells // self.chunk_size + 1
+        dirty[tuple(chunk_cells.T)] = True
+        for axis in range(3):
+            local = cells[:, axis] % self.chunk_size
+            for side, border in ((-1, 0), (1, self.chunk_size - 1)):
+                neighbors = chunk_cells[local == border]
+                neighbors[:, axis] += side
+                dirty[tuple(neighbors.T)] = True
+        indices = np.argwhere(dirty[1:-1, 1:-1, 1:-1])
+        self.dirty_chunks.update(
+            index for index in map(tuple, indices.tolist())
+            if index in self.chunks)
+
+    def _clip_box(self, start, stop):
+        start = np.maximum(np.asarray(start, dtype=np.int64), 0)
+        stop = np.minimum(np.asarray(stop, dtype=np.int64),
+                          self.dimensions - 1)
+        return start, stop
+
+    def _get_chunk_indices(self, start, stop):
+        # indices of the chunks intersecting the cells in [start, stop)
+        return itertools.product(*(
+            range(first, last + 1) for first, last in
+            zip(start // self.chunk_size, (stop - 1) // self.chunk_size)))
+
+    def _mark_dirty(self, start, stop):
+        # the surface of the chunks sharing a face with the modified cells
+        # depends on them too
+        for axis in range(3):
+            padding = np.zeros(3, dtype=np.int64)
+            padding[axis] = 1
+            padded_start, padded_stop = self._clip_box(
+                np.asarray(start) - padding, np.asarray(stop) + padding)
+            if np.any(padded_stop <= padded_start):
+                continue
+            self.dirty_chunks.update(
+                index for index in
+                self._get_chunk_indices(padded_start, padded_stop)
+                if index in self.chunks)
+
+    def get_chunk_windows(self):
+        """Yield the start and the (z, y, x) ghosts and colors of the chunks.
+
+        The empty chunks of the sparse storage are skipped.
+        """
+        return self._get_windows(self.dimensions - 1, self.chunk_size)
+
+    def _get_windows(self, stop, window_size=None):
+        # yield the (start, ghosts, colors) windows of the cells in
+        # [0, stop), the sparse storage yields its occupied chunks
+        stop = np.asarray(stop, dtype=np.int64)
+        if self.storage == "sparse":
+            for chunk in list(self.chunks.values()):
+                if np.any(chunk.start >= stop):
+                    continue
+                region = _box_to_region(
+                    np.zeros(3, dtype=np.int64),
+                    np.minimum(stop, chunk.stop) - chunk.start)
+                yield (chunk.start,
+                       _as_grid(chunk.ghosts, chunk.dimensions)[region],
+                       _as_grid(chunk.colors, chunk.dimensions)[region])
+            return
+        if window_size is None:
+            window_size = max(int(np.max(stop)), 1)
+        ghosts = _as_grid(self.ghosts, self.dimensions)
+        colors = _as_grid(self.colors, self.dimensions)
+        for start in itertools.product(*(
+                range(0, size, window_size) for size in stop)):
+            start = np.asarray(start, dtype=np.int64)
+            region = _box_to_region(
+                start, np.minimum(start + window_size, stop))
+            yield start, ghosts[region], colors[region]
+
+    def _add_chunk(self, index):
+        chunk = Chunk(self, index, self.cache)
+        if self.actor is not None:
+            self._add_chunk_actor(chunk)
+        self.chunks[index] = chunk
+        self.dirty_chunks.add(index)
+        return chunk
+
+    def _add_chunk_actor(self, chunk):
+        plotting = dict(self.plotting, mesh=chunk.surface)
+        chunk.actor = self.create_actor(**plotting)
+        chunk.actor.element_id = self.element_id
+        self._set_chunk_edges(chunk)
+        self.actor.AddPart(chunk.actor)
+
+    def _set_chunk_edges(self, chunk):
+        prop = chunk.actor.GetProperty()
+        if self.edge_texture is None:
+            prop.SetEdgeVisibility(self.show_edges)
+        else:
+            prop.SetEdgeVisibility(False)
+            if self.show_edges:
+                chunk.actor.SetTexture(self.edge_texture)
+            else:
+                chunk.actor.SetTexture(None)
+
+    def _remove_chunk(self, index):
+        chunk = self.chunks.pop(index)
+        self.dirty_chunks.discard(index)
+        if self.cache is not None:
+            self.cache.discard(chunk)
+        if chunk.actor is not None:
+            self.actor.RemovePart(chunk.actor)
+
+    def flush(self):
+        """Write the modified chunks to the disk if they are paged."""
+        if self.cache is not None:
+            self.cache.flush()
+
+    def _load_cache(self):
+        # the chunks stored by a previous session are loaded on demand
+        metadata = self.cache.read_metadata()
+        if metadata is None:
+            if self.cache.get_stored_indices():
+                raise ValueError("The chunks stored in {} have no "
+                                 "metadata".format(self.cache.path))
+            # the metadata is written first to identify the chunks
+            self.cache.flush()
+            return
+        if not np.array_equal(metadata["dimensions"], self.dimensions) or \
+           int(metadata["chunk_size"]) != self.chunk_size or \
+           str(metadata["color_type"]) != self.color_type:
+            raise ValueError("The chunks stored in {} do not match the "
+                             "blocks".format(self.cache.path))
+        if len(metadata["palette"]) > 0:
+            self._set_palette(metadata["palette"])
+        for index in self.cache.get_stored_indices():
+            self._add_chunk(index)
+
+    def _get_mesh(self):
+        # the implicit storage only keeps the origin and the spacing
+        if self.storage == "sparse":
+            return None
+        elif self.storage == "implicit":
+            get_grid = get_uniform_grid
+        else:
+            get_grid = get_structured_grid
+        # with a palette, the cells store the id of their material
+        if self.color_type == "palette":
+            cell_color = (0,)
+        else:
+            cell_color = _convert_colors(self.color, self.color_type)
+        return get_grid(
+            dimensions=self.dimensions,
+            origin=self.origin,
+            spacing=self.spacing,
+            array_name=self.color_array_name,
+            color=cell_color,
+            dtype=COLOR_TYPES[self.color_type],
+        )
+
+    @contextmanager
+    def transaction(self):
+        """Group the edits and update the blocks once at the end."""
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def begin(self):
+        """Start a transaction, the updates are deferred until commit."""
+        self.transaction_depth += 1
+
+    def commit(self):
+        """End a transaction and apply the deferred updates."""
+        if self.transaction_depth == 0:
+            raise RuntimeError("There is no transaction to commit.")
+        self.transaction_depth -= 1
+        if self.transaction_depth == 0 and self.pending_update:
+            self._modified()
+
+    def _modified(self):
+        self.revision += 1
+        # the updates are deferred until the end of the transaction
+        if self.transaction_depth > 0:
+            self.pending_update = True
+            return
+        self.pending_update = False
+        self._end_gesture()
+        if self.mesh is not None:
+            self.ghost_array.Modified()
+            self.color_array.Modified()
+            self.mesh.Modified()
+        self.update_chunks()
+
+    def update_chunks(self):
+        """Update the surfaces of the modified chunks only."""
+        if self.storage == "sparse":
+            # the empty chunks are released
+            for index in list(self.dirty_chunks):
+                if self.chunks[index].is_empty():
+                    self._remove_chunk(index)
+        for index in self.dirty_chunks:
+            chunk = self.chunks[index]
+            chunk.update(*self._get_chunk_grids(chunk))
+            # the paged chunks are written back when they are evicted
+            chunk.modified = True
+        self.dirty_chunks.clear()
+
+    def _get_chunk_grids(self, chunk):
+        # the ghosts of the chunk are padded with its neighbors
+        shape = tuple(np.asarray(chunk.shape) + 2)
+        ghosts = np.full(shape, HIDDEN_CELL, dtype=np.uint8)
+        for region, chunk_ghosts, _ in self._get_regions(chunk.start - 1,
+                                                         chunk.stop + 1):
+            ghosts[region] = chunk_ghosts
+        # the chunks are aligned with the storage
+        _, _, colors = next(self._get_regions(chunk.start, chunk.stop))
+        return ghosts, colors
+
+    def load_actor(self, create_actor):
+        """Create the chunks and their actors with ``create_actor``."""
+        self.actor = vtk.vtkAssembly()
+        self.create_actor = create_actor
+        if self.storage == "sparse":
+            # the chunks are created on demand
+            for chunk in self.chunks.values():
+                self._add_chunk_actor(chunk)
+            self.update_chunks()
+            return self.actor
+        self.chunks = dict()
+        number_of_chunks = np.ceil(
+            (self.dimensions - 1) / self.chunk_size).astype(int)
+        for index in np.ndindex(*number_of_chunks):
+            self._add_chunk(index)
+        self.dirty_chunks.update(self.chunks.keys())
+        self.update_chunks()
+        return self.actor
+
+    def is_visible(self, coords):
+        """Return True if there is a block at the given coords."""
+        coords = np.asarray(coords, dtype=np.int64)
+        if np.any(coords < 0) or np.any(coords >= self.dimensions - 1):
+            return False
+        return self._is_visible(*coords.tolist())
+
+    def _is_visible(self, x, y, z):
+        # lookup of a cell inside the blocks with plain integers
+        if self.storage == "sparse":
+            size = self.chunk_size
+            chunk = self.chunks.get((x // size, y // size, z // size))
+            if chunk is None:
+                return False
+            x, y, z = x % size, y % size, z % size
+            nx, ny = chunk.dimensions[0] - 1, chunk.dimensions[1] - 1
+            ghosts = chunk.ghosts
+        else:
+            nx, ny = self.dimensions[0] - 1, self.dimensions[1] - 1
+            ghosts = self.ghosts
+        return not ghosts[x + (y + z * ny) * nx] & HIDDEN_CELL
+
+    def raycast(self, origin, direction):
+        """Find the first block hit by the ray.
+
+        Return the coords of the block, the normal of the face hit and the
+        distance along the ray in units of ``direction``, or None. There is
+        no face hit if the ray starts inside a block.
+        """
+        # the cells are traversed in order along the ray (3D DDA)
+        origin = (np.asarray(origin, dtype=np.float64) - self.origin) / \
+            self.spacing
+        direction = np.asarray(direction, dtype=np.float64) / self.spacing
+        cell_dimensions = self.dimensions - 1
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1. / direction
+            bounds = np.stack((-origin * inverse,
+                               (cell_dimensions - origin) * inverse))
+        # clip the ray to the bounds of the blocks
+        parallel = direction == 0
+        if np.any(parallel & ((origin < 0) | (origin > cell_dimensions))):
+            return None
+        enter = np.where(parallel, -np.inf, bounds.min(axis=0))
+        leave = np.where(parallel, np.inf, bounds.max(axis=0))
+        distance = max(enter.max(), 0.)
+        exit_distance = leave.min()
+        if distance > exit_distance:
+            return None
+        normal = [0, 0, 0]
+        if enter.max() >= 0:
+            axis = int(np.argmax(enter))
+            normal[axis] = -int(np.sign(direction[axis]))
+        position = origin + distance * direction
+        cell = np.clip(np.floor(position), 0, cell_dimensions - 1)
+        cell = cell.astype(np.int64).tolist()
+        step = np.sign(direction).astype(np.int64).tolist()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            next_distance = np.where(
+                parallel, np.inf,
+                (np.add(cell, np.greater(step, 0)) - origin) * inverse)
+            delta = np.where(parallel, np.inf, np.abs(inverse))
+        next_distance = next_distance.tolist()
+        delta = delta.tolist()
+        cell_dimensions = cell_dimensions.tolist()
+        while True:
+            if self._is_visible(*cell):
+                if not any(normal):
+                    return None
+                return np.asarray(cell), np.asarray(normal), distance
+            axis = next_distance.index(min(next_distance))
+            distance = next_distance[axis]
+            cell[axis] += step[axis]
+            if distance > exit_distance or \
+               not 0 <= cell[axis] < cell_dimensions[axis]:
+                return None
+            next_distance[axis] += delta[axis]
+            normal = [0, 0, 0]
+            normal[axis] = -step[axis]
+
+    def as_structured_grid(self):
+        """Return the blocks as a vtkStructuredGrid."""
+        if isinstance(self.mesh, vtk.vtkStructuredGrid):
+            return self.mesh
+        return uniform_grid_to_structured_grid(self.as_uniform_grid())
+
+    def as_uniform_grid(self):
+        """Return the blocks as a vtkUniformGrid."""
+        if isinstance(self.mesh, vtk.vtkUniformGrid):
+            return self.mesh
+        elif self.mesh is not None:
+            return structured_grid_to_uniform_grid(self.mesh, self.spacing)
+        # the sparse blocks are copied into a dense mesh
+        mesh = get_uniform_grid(
+            dimensions=self.dimensions,
+            origin=self.origin,
+            spacing=self.spacing,
+            array_name=self.color_array_name,
+            color=np.atleast_1d(self.cell_color),
+            dtype=self.color_dtype,
+        )
+        ghosts = vtk_to_numpy(get_mesh_ghost_array(mesh))
+        ghosts |= np.uint8(HIDDEN_CELL)
+        ghosts = _as_grid(ghosts, self.dimensions)
+        colors = _as_grid(vtk_to_numpy(
+            get_mesh_cell_array(mesh, self.color_array_name)),
+            self.dimensions)
+        for start, chunk_ghosts, chunk_colors in \
+                self._get_windows(self.dimensions - 1):
+            region = _box_to_region(start, start + chunk_ghosts.shape[::-1])
+            ghosts[region] = chunk_ghosts
+            colors[region] = chunk_colors
+        if self.palette is not None:
+            mesh.GetFieldData().AddArray(self._get_palette_array())
+        return mesh
 
     def toggle_edges(self, value):
         """Toggle visibility of the block edges."""
         self.show_edges = value
-        prop = self.actor.GetProperty()
-        prop.SetEdgeVisibility(value)
+        for chunk in self.chunks.values():
+            if chunk.actor is not None:
+                self._set_chunk_edges(chunk)
 
     def set_color(self, color, is_int=False):
         """Set the current color."""
-        color = np.asarray(color)
+        color = np.asarray(color, dtype=np.float64)
         if is_int:
             color = color / 255.
         self.color = color
+        if self.palette is None:
+            self.cell_color = _convert_colors(self.color, self.color_type)
+        else:
+            self.cell_color = self._get_materials(self.color)[0]
+
+    def set_palette_color(self, material, color, is_int=False):
+        """Set the color of a material of the palette."""
+        if self.palette is None:
+            raise ValueError("Expected ``palette`` for the color type but {}"
+                             " was given.".format(self.color_type))
+        color = np.asarray(color, dtype=np.float64)
+        if is_int:
+            color = color / 255.
+        palette = self.palette.copy()
+        palette[material] = color
+        self._set_palette(palette)
+
+    def set_palette(self, palette):
+        """Set the colors of all the materials of the palette."""
+        if self.palette is None:
+            raise ValueError("Expected ``palette`` for the color type but {}"
+                             " was given.".format(self.color_type))
+        self._set_palette(palette)
+
+    def _set_palette(self, palette):
+        self.palette = np.asarray(palette, dtype=np.float64)
+        self.revision += 1
+        if self.journal is not None:
+            self.journal.append_palette(self.palette)
+        # the palette is stored in the field data to be exported
+        if self.mesh is not None:
+            self.mesh.GetFieldData().AddArray(self._get_palette_array())
+        # the ids of the materials are mapped to the colors of the palette
+        number_of_materials = len(self.palette)
+        table = np.full((number_of_materials, 4), 255, dtype=np.uint8)
+        table[:, :3] = _convert_colors(self.palette, "uint8")
+        self.lookup_table.SetTable(numpy_to_vtk(table, deep=True))
+        self.lookup_table.SetTableRange(-.5, number_of_materials - .5)
+        self.lookup_table.Modified()
+
+    def _get_palette_array(self):
+        palette_array = numpy_to_vtk(self.palette, deep=True)
+        palette_array.SetName(self.palette_array_name)
+        return palette_array
+
+    def _get_materials(self, colors):
+        # find the material of each color, unknown colors are added
+        keys = _color_keys(colors)
+        palette_keys = _color_keys(self.palette)
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        sorter = np.argsort(palette_keys, kind="stable")
+        index = np.searchsorted(palette_keys, unique_keys, sorter=sorter)
+        index = sorter[np.minimum(index, len(sorter) - 1)]
+        found = palette_keys[index] == unique_keys
+        number_of_materials = len(self.palette) + np.count_nonzero(~found)
+        if number_of_materials > MAX_MATERIALS:
+            raise ValueError("The palette is limited to {} materials but {}"
+                             " are required.".format(MAX_MATERIALS,
+                                                     number_of_materials))
+        if not all(found):
+            new_colors = _convert_colors(_color_keys_to_colors(
+                unique_keys[~found]), "float")
+            index[~found] = np.arange(len(self.palette), number_of_materials)
+            self._set_palette(np.concatenate((self.palette, new_colors)))
+        return index[inverse.ravel()].astype(COLOR_TYPES["palette"])
+
+
+def _coords_to_box(coords):
+    # the cells of an area or of single coords as [start, stop)
+    if isinstance(coords, tuple):
+        start, stop = np.asarray(coords[0]), np.asarray(coords[1])
+    else:
+        start = stop = np.asarray(coords)
+    start = start.astype(np.int64)
+    return start, stop.astype(np.int64) + 1
+
+
+def _cells_to_indices(cells, dimensions):
+    # flat indices of the cells, x varying first
+    nx, ny = dimensions[0] - 1, dimensions[1] - 1
+    return cells[:, 0] + (cells[:, 1] + cells[:, 2] * ny) * nx
+
+
+def _indices_to_cells(indices, dimensions):
+    # coords of the cells from their flat indices
+    return np.stack(np.unravel_index(indices, _cell_shape(dimensions))[::-1],
+                    axis=-1)
+
+
+def _box_to_region(start, stop):
+    # slices of the cells in [start, stop) in a (z, y, x) grid
+    return tuple(slice(first, last) for first, last in
+                 zip(start[::-1], stop[::-1]))
+
+
+def _cell_shape(dimensions):
+    # number of cells along each axis, slowest varying first
+    return tuple(np.asarray(dimensions[::-1]) - 1)
+
+
+def _as_grid(array, dimensions):
+    # reshape a cell array into a (z, y, x, ...) view
+    return array.reshape(_cell_shape(dimensions) + array.shape[1:])
+
+
+def _color_type(colors):
+    if np.issubdtype(colors.dtype, np.integer):
+        return "uint8"
+    else:
+        return "float"
+
+
+def _convert_colors(colors, color_type):
+    # the stored colors are either RGB floats in [0, 1] or uint8 RGB
+    colors = np.asarray(colors)[..., :3]
+    if _color_type(colors) == color_type:
+        return colors
+    elif color_type == "uint8":
+        colors = np.clip(np.round(colors * 255.), 0, 255)
+        return colors.astype(np.uint8)
+    else:
+        return colors / 255.
+
+
+def _color_keys(colors):
+    colors = _convert_colors(colors, "uint8").reshape(-1, 3)
+    colors = colors.astype(np.uint32)
+    return (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
 
 
-def _area_to_coords(area):
-    X = np.arange(area[0][0], area[1][0] + 1)
-    Y = np.arange(area[0][1], area[1][1] + 1)
-    Z = np.arange(area[0][2], area[1][2] + 1)
-    return np.array(np.meshgrid(X, Y, Z)).T.reshape(-1, 3)
-
-
-def _coords_to_cell(coords, dimensions):
-    coords = np.asarray(coords)
-    cell_id = coords[0] + \
-        coords[1] * (dimensions[0] - 1) + \
-        coords[2] * (dimensions[0] - 1) * (dimensions[1] - 1)
-    return int(cell_id)
-
-
-def _cell_to_coords(cell_id, dimensions):
-    offset = [
-        0,
-        (dimensions[0] - 1),
-        (dimensions[0] - 1) * (dimensions[1] - 1),
-    ]
-    coords = np.empty(3)
-    coords[2] = np.floor(cell_id / offset[2])
-    coords[1] = cell_id % offset[2]
-    coords[1] = np.floor(coords[1] / offset[1])
-    coords[0] = (cell_id % offset[2]) % offset[1]
-    return coords
+def _color_keys_to_colors(keys):
+    keys = np.asarray(keys, dtype=np.uint32)
+    colors = np.stack(((keys >> 16) & 0xff, (keys >> 8) & 0xff, keys & 0xff),
+                      axis=-1)
+    return colors.astype(np.uint8)
@@ -0,0 +1,159 @@
+"""Module about the native blockset file format."""
+
+import itertools
+import struct
+import zlib
+import numpy as np
+
+from .chunk import HIDDEN_CELL
+
+EXTENSION = ".bb"
+MAGIC = b"BBS1"
+# magic, compression, dimensions, color type, color dtype, components,
+# number of materials, size of the occupancy and size of the colors
+HEADER = struct.Struct("<4sB3I8s4sIIQQ")
+ALIGNMENT = 64
+# number of set bits of each byte
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis],
+                         axis=1).sum(axis=1).astype(np.int64)
+
+
+class Blockset(object):
+    """Blocks of a native blockset, the cells are read when accessed.
+
+    The occupancy is a bitset of the cells in the order of their ids and
+    the colors are stored for the visible cells only.
+    """
+
+    def __init__(self, dimensions, color_type, occupancy, colors, palette):
+        """Initialize the Blockset."""
+        self.dimensions = np.asarray(dimensions)
+        self.number_of_cells = int(np.prod(self.dimensions - 1))
+        self.color_type = color_type
+        self.occupancy = occupancy
+        self.colors = colors
+        self.palette = palette if len(palette) > 0 else None
+        self.ranks = None
+
+    def get_visible_cells(self):
+        """Return the ids and the colors of the visible cells."""
+        visible = np.unpackbits(self.occupancy, count=self.number_of_cells)
+        return np.flatnonzero(visible), np.asarray(self.colors)
+
+    def _get_windows(self, stop, window_size=None):
+        # yield the (start, ghosts, colors) windows of the cells in
+        # [0, stop) like Block so that it can be merged
+        stop = np.asarray(stop, dtype=np.int64)
+        if window_size is None:
+            window_size = max(int(np.max(stop)), 1)
+        nx, ny = self.dimensions[0] - 1, self.dimensions[1] - 1
+        for start in itertools.product(*(
+                range(0, size, window_size) for size in stop)):
+            start = np.asarray(start, dtype=np.int64)
+            x, y, z = (np.arange(start[axis], min(start[axis] + window_size,
+                                                  stop[axis]))
+                       for axis in range(3))
+            ids = x[np.newaxis, np.newaxis] + \
+                (y[np.newaxis, :, np.newaxis] +
+                 z[:, np.newaxis, np.newaxis] * ny) * nx
+            visible = self._get_bits(ids)
+            ghosts = np.where(visible, np.uint8(0), np.uint8(HIDDEN_CELL))
+            colors = np.zeros(ids.shape + self.colors.shape[1:],
+                              dtype=self.colors.dtype)
+            if np.any(visible):
+                colors[visible] = self.colors[self._get_ranks(ids[visible])]
+            yield start, ghosts, colors
+
+    def _get_bits(self, ids):
+        # the bits are packed with the first cell in the highest bit
+        return (self.occupancy[ids >> 3] >> (7 - (ids & 7))) & 1 == 1
+
+    def _get_ranks(self, ids):
+        # index of the colors of the visible cells
+        if self.ranks is None:
+            self.ranks = np.concatenate((
+                [0], np.cumsum(POPCOUNT[self.occupancy])))
+        index = ids >> 3
+        before = self.occupancy[index].astype(np.int64) >> (8 - (ids & 7))
+        return self.ranks[index] + POPCOUNT[before]
+
+
+def write_blockset(filename, state, compression=False):
+    """Write a copy of the blocks given by ``copy_state``."""
+    dimensions = np.asarray(state["dimensions"])
+    number_of_cells = int(np.prod(dimensions - 1))
+    order = np.argsort(state["ids"], kind="stable")
+    occupancy = np.zeros(number_of_cells, dtype=bool)
+    occupancy[state["ids"]] = True
+    colors = np.ascontiguousarray(state["colors"][order])
+    color_dtype = colors.dtype.newbyteorder("<")
+    sections = [
+        np.packbits(occupancy).tobytes(),
+        colors.astype(color_dtype).tobytes(),
+    ]
+    if compression:
+        sections = [zlib.compress(section) for section in sections]
+    palette = np.asarray(state["palette"], dtype="<f8")
+    header = HEADER.pack(
+        MAGIC, int(compression), *dimensions.tolist(),
+        state["color_type"].encode("ascii"),
+        color_dtype.str.encode("ascii"),
+        int(np.prod(colors.shape[1:])) if colors.ndim > 1 else 0,
+        len(palette), *(len(section) for section in sections),
+    )
+    with open(str(filename), "wb") as fp:
+        for data in [header] + sections + [palette.tobytes()]:
+            # the sections are aligned to be memory-mapped
+            fp.write(b"\x00" * (_align(fp.tell()) - fp.tell()))
+            fp.write(data)
+
+
+def read_blockset(filename):
+    """Return the Blockset of a file.
+
+    The uncompressed sections are memory-mapped instead of being read.
+    """
+    filename = str(filename)
+    with open(filename, "rb") as fp:
+        (magic, compression, nx, ny, nz, color_type, dtype, components,
+         number_of_materials, occupancy_size, colors_size) = \
+            HEADER.unpack(fp.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("{} is not a blockset file".format(filename))
+        dimensions = np.array([nx, ny, nz])
+        color_type = color_type.decode("ascii").strip("\x00")
+        color_dtype = np.dtype(dtype.decode("ascii").strip("\x00"))
+        color_shape = (components,) if components else ()
+        offsets = list()
+        offset = HEADER.size
+        for size in (occupancy_size, colors_size, number_of_materials * 24):
+            offset = _align(offset)
+            offsets.append(offset)
+            offset += size
+        if compression:
+            sections = list()
+            for offset, size in zip(offsets, (occupancy_size, colors_size)):
+                fp.seek(offset)
+                sections.append(zlib.decompress(fp.read(size)))
+            occupancy = np.frombuffer(sections[0], dtype=np.uint8)
+            colors = np.frombuffer(sections[1], dtype=color_dtype)
+        else:
+            occupancy = _memmap(filename, np.uint8, offsets[0],
+                                occupancy_size)
+            colors = _memmap(filename, color_dtype, offsets[1], colors_size)
+        fp.seek(offsets[2])
+        palette = np.frombuffer(fp.read(number_of_materials * 24),
+                                dtype="<f8").reshape(-1, 3)
+    colors = colors.reshape((-1,) + color_shape)
+    return Blockset(dimensions, color_type, occupancy, colors, palette)
+
+
+def _memmap(filename, dtype, offset, size):
+    if size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode="r", offset=offset,
+                     shape=(size // np.dtype(dtype).itemsize,))
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,111 @@
+"""Module about the chunks of cells paged out to the disk."""
+
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+
+METADATA = "chunks.npz"
+
+
+class ChunkCache(object):
+    """Cells of the chunks kept in memory within a budget.
+
+    The least recently used chunks are evicted first, the modified ones
+    are written to one file each in ``path``, or in a temporary directory
+    if ``path`` is empty.
+    """
+
+    def __init__(self, block, path, budget):
+        """Initialize the ChunkCache, ``budget`` is in bytes."""
+        self.block = block
+        self.budget = budget
+        self.loaded = OrderedDict()
+        self.nbytes = 0
+        self.temporary = not path
+        if self.temporary:
+            self.path = Path(tempfile.mkdtemp(prefix="blockbuilder-"))
+            # the temporary chunks are removed with the cache
+            weakref.finalize(self, shutil.rmtree, str(self.path),
+                             ignore_errors=True)
+        else:
+            self.path = Path(path)
+            self.path.mkdir(parents=True, exist_ok=True)
+
+    def get_stored_indices(self):
+        """Return the indices of the chunks stored on the disk."""
+        return [tuple(int(value) for value in filename.stem.split("_"))
+                for filename in self.path.glob("*.chunk")]
+
+    def read_metadata(self):
+        """Return the metadata of the stored chunks or None."""
+        filename = self.path.joinpath(METADATA)
+        if not filename.exists():
+            return None
+        with np.load(str(filename)) as metadata:
+            return {key: metadata[key] for key in metadata.files}
+
+    def touch(self, chunk):
+        """Load the cells of the chunk if needed and mark it as used."""
+        if chunk.index in self.loaded:
+            self.loaded.move_to_end(chunk.index)
+            return
+        filename = self._get_filename(chunk.index)
+        if filename.exists():
+            chunk.allocate(*self._read(chunk, filename))
+        else:
+            chunk.allocate()
+        self.loaded[chunk.index] = chunk
+        self.nbytes += chunk.nbytes
+        # the chunk in use is never evicted
+        while self.nbytes > self.budget and len(self.loaded) > 1:
+            _, evicted = self.loaded.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            if self._is_modified(evicted):
+                self._write(evicted)
+            evicted.release()
+
+    def discard(self, chunk):
+        """Forget the chunk, in memory and on the disk."""
+        if self.loaded.pop(chunk.index, None) is not None:
+            self.nbytes -= chunk.nbytes
+        filename = self._get_filename(chunk.index)
+        if filename.exists():
+            filename.unlink()
+
+    def flush(self):
+        """Write the modified chunks and the metadata to the disk."""
+        for chunk in self.loaded.values():
+            if self._is_modified(chunk):
+                self._write(chunk)
+        palette = self.block.palette
+        np.savez(
+            str(self.path.joinpath(METADATA)),
+            dimensions=self.block.dimensions,
+            chunk_size=self.block.chunk_size,
+            color_type=self.block.color_type,
+            palette=np.zeros((0, 3)) if palette is None else palette,
+        )
+
+    def _is_modified(self, chunk):
+        # the edited chunks are flagged until their surface is updated
+        return chunk.modified or chunk.index in self.block.dirty_chunks
+
+    def _get_filename(self, index):
+        return self.path.joinpath("{}_{}_{}.chunk".format(*index))
+
+    def _read(self, chunk, filename):
+        number_of_cells = int(np.prod(chunk.shape))
+        with open(str(filename), "rb") as fp:
+            ghosts = np.fromfile(fp, dtype=np.uint8, count=number_of_cells)
+            colors = np.fromfile(fp, dtype=chunk.color_dtype)
+        if len(ghosts) != number_of_cells:
+            raise ValueError("{} does not match the chunk size {}".format(
+                filename, self.block.chunk_size))
+        return ghosts, colors
+
+    def _write(self, chunk):
+        chunk.save(self._get_filename(chunk.index))
+        chunk.modified = False
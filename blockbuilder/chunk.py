@@ -0,0 +1,131 @@
+"""Module about the block chunks."""
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy
+from .utils import get_uniform_grid, get_mesh_cell_array, get_mesh_ghost_array
+from .surface import extract_surface, set_quads
+
+HIDDEN_CELL = vtk.vtkDataSetAttributes.HIDDENCELL
+
+
+class Chunk(object):
+    """Fixed-size part of the blocks with its own surface and actor."""
+
+    def __init__(self, block, index, cache=None):
+        """Initialize the Chunk.
+
+        With a ChunkCache, the cells are loaded when they are accessed.
+        """
+        self.actor = None
+        self.cache = cache
+        self.modified = False
+        self.index = tuple(index)
+        cell_dimensions = np.asarray(block.dimensions) - 1
+        self.start = np.asarray(index) * block.chunk_size
+        self.stop = np.minimum(self.start + block.chunk_size, cell_dimensions)
+        self.dimensions = self.stop - self.start + 1
+        # location of the chunk in a (z, y, x) grid of cells
+        self.region = tuple(slice(start, stop) for start, stop in
+                            zip(self.start[::-1], self.stop[::-1]))
+        self.shape = tuple(self.dimensions[::-1] - 1)
+        self.origin = block.origin + self.start * block.spacing
+        self.spacing = block.spacing
+        self.color_array_name = block.color_array_name
+        self.greedy_meshing = block.greedy_meshing
+        self.cell_color = np.atleast_1d(block.cell_color)
+        self.color_dtype = block.color_dtype
+        self.release()
+        # only the sparse storage keeps its blocks in the chunks
+        if block.storage == "sparse" and cache is None:
+            self.allocate()
+        # only the exterior faces of the blocks are rendered
+        self.surface = vtk.vtkPolyData()
+        self.number_of_faces = 0
+        self.visible = False
+
+    @property
+    def ghosts(self):
+        """Return the ghosts of the cells of the chunk."""
+        if self.cache is not None:
+            self.cache.touch(self)
+        return self._ghosts
+
+    @property
+    def colors(self):
+        """Return the colors of the cells of the chunk."""
+        if self.cache is not None:
+            self.cache.touch(self)
+        return self._colors
+
+    @property
+    def nbytes(self):
+        """Return the memory used by the cells of the chunk."""
+        if self._ghosts is None:
+            return 0
+        return self._ghosts.nbytes + self._colors.nbytes
+
+    def allocate(self, ghosts=None, colors=None):
+        """Create the cells of the chunk, empty unless they are given."""
+        self.mesh = get_uniform_grid(
+            dimensions=self.dimensions,
+            origin=self.origin,
+            spacing=self.spacing,
+            array_name=self.color_array_name,
+            color=self.cell_color,
+            dtype=self.color_dtype,
+        )
+        self.color_array = get_mesh_cell_array(
+            self.mesh,
+            self.color_array_name
+        )
+        self.ghost_array = get_mesh_ghost_array(self.mesh)
+        self._colors = vtk_to_numpy(self.color_array)
+        self._ghosts = vtk_to_numpy(self.ghost_array)
+        if ghosts is None:
+            # a new chunk is empty
+            self._ghosts |= np.uint8(HIDDEN_CELL)
+        else:
+            self._ghosts[:] = ghosts
+            self._colors[:] = np.reshape(colors, self._colors.shape)
+
+    def release(self):
+        """Release the cells of the chunk, its surface is kept."""
+        self.mesh = None
+        self.color_array = None
+        self.ghost_array = None
+        self._colors = None
+        self._ghosts = None
+
+    def save(self, filename):
+        """Write the cells of the chunk to a file."""
+        with open(str(filename), "wb") as fp:
+            fp.write(self._ghosts.tobytes())
+            fp.write(self._colors.tobytes())
+
+    def update(self, ghosts, colors):
+        """Extract the surface of the chunk.
+
+        ``ghosts`` is the (z, y, x) grid of the chunk padded by one cell on
+        each side to know the neighbors and ``colors`` is the grid of the
+        chunk only.
+        """
+        filled = (ghosts & HIDDEN_CELL) == 0
+        points, tcoords, face_colors = extract_surface(
+            filled, colors, greedy=self.greedy_meshing)
+        points = points * self.spacing + self.origin
+        set_quads(self.surface, points, self.color_array_name, face_colors,
+                  tcoords)
+        self.number_of_faces = len(face_colors)
+        self.visible = self.number_of_faces > 0
+        if self.mesh is not None:
+            self.ghost_array.Modified()
+            self.color_array.Modified()
+            self.mesh.Modified()
+        # the chunks without faces are not rendered at all
+        if self.actor is not None:
+            self.actor.SetVisibility(self.visible)
+
+    def is_empty(self):
+        """Return True if the chunk does not store any block."""
+        return bool(np.all(self.ghosts & HIDDEN_CELL))
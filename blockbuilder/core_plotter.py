@@ -1,6 +1,8 @@
 """Module about core visual properties."""
 
+import time
 import vtk
+from qtpy.QtCore import QTimer
 from .minimal_plotter import MinimalPlotter
 
 
@@ -15,6 +17,12 @@ class CorePlotter(MinimalPlotter):
         self.params = params
         self.show_edges = self.params["plotter"]["show_edges"]
         self.line_width = self.params["plotter"]["line_width"]
+        self.max_fps = self.params["plotter"]["max_fps"]
+        self.last_render_time = None
+        # the render requests are coalesced until the next frame
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.timeout.connect(self._render_scene)
         if window_size is None:
             window_size = self.params["plotter"]["window_size"]
         if advanced is None:
@@ -89,7 +97,31 @@ class CorePlotter(MinimalPlotter):
         self.renderer.Modified()
 
     def render_scene(self):
-        """Render the scene."""
+        """Request a render of the scene, at most once per frame."""
+        if self.render_timer.isActive():
+            return
+        if self.max_fps <= 0:
+            self._render_scene()
+            return
+        delay = 0.
+        if self.last_render_time is not None:
+            elapsed = time.perf_counter() - self.last_render_time
+            delay = max(1. / self.max_fps - elapsed, 0.)
+        self.render_timer.start(int(delay * 1000))
+
+    def flush_render(self):
+        """Render the scene now if a render was requested."""
+        if self.render_timer.isActive():
+            self.render_timer.stop()
+            self._render_scene()
+
+    def closeEvent(self, event):
+        """Cancel the pending render before closing."""
+        self.render_timer.stop()
+        super().closeEvent(event)
+
+    def _render_scene(self):
+        self.last_render_time = time.perf_counter()
         # fix the clipping planes being too small
         rng = [0] * 6
         self.renderer.ComputeVisiblePropBounds(rng)
@@ -98,20 +130,43 @@ class CorePlotter(MinimalPlotter):
         self.render_window.Render()
 
     def add_mesh(self, mesh, rgba=False, color=(1., 1., 1.), opacity=1.,
-                 edge_color=(0., 0., 0.)):
+                 edge_color=(0., 0., 0.), lookup_table=None):
         """Add a mesh to the scene."""
-        mapper = vtk.vtkDataSetMapper()
+        actor = self.create_actor(
+            mesh=mesh,
+            rgba=rgba,
+            color=color,
+            opacity=opacity,
+            edge_color=edge_color,
+            lookup_table=lookup_table,
+        )
+        self.add_actor(actor)
+        return actor
+
+    def add_actor(self, actor):
+        """Add an actor to the scene."""
+        self.renderer.AddActor(actor)
+        self.renderer.Modified()
+
+    def create_actor(self, mesh, rgba=False, color=(1., 1., 1.), opacity=1.,
+                     edge_color=(0., 0., 0.), lookup_table=None):
+        """Create the actor of a mesh without adding it to the scene."""
+        if isinstance(mesh, vtk.vtkPolyData):
+            mapper = vtk.vtkPolyDataMapper()
+        else:
+            mapper = vtk.vtkDataSetMapper()
         mapper.SetInputData(mesh)
         actor = vtk.vtkActor()
         actor.SetMapper(mapper)
         if rgba:
             mapper.SetColorModeToDirectScalars()
+        if lookup_table is not None:
+            mapper.SetLookupTable(lookup_table)
+            mapper.UseLookupTableScalarRangeOn()
         prop = actor.GetProperty()
         prop.SetColor(color)
         prop.SetOpacity(opacity)
         prop.SetEdgeColor(edge_color)
         prop.SetLineWidth(self.line_width)
         prop.SetEdgeVisibility(self.show_edges)
-        self.renderer.AddActor(actor)
-        self.renderer.Modified()
         return actor
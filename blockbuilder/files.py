@@ -0,0 +1,96 @@
+"""Module about the files of blocksets."""
+
+import os
+import vtk
+
+from .block import Block
+from .journal import copy_state
+from .blockset import (read_blockset, write_blockset,
+                       EXTENSION as BLOCKSET_EXTENSION)
+from .partition import (read_partitioned, write_partitioned,
+                        EXTENSION as PARTITION_EXTENSION)
+
+
+def read_file(task, params, filename):
+    """Return the blocks of a file.
+
+    The progress is reported to the Task if any, None is returned if it is
+    cancelled.
+    """
+    if filename.endswith(BLOCKSET_EXTENSION):
+        # the cells are read during the merge
+        return read_blockset(filename)
+    if filename.endswith(PARTITION_EXTENSION):
+        mesh = read_partitioned(filename, params["blockset"]["workers"],
+                                task)
+        if mesh is None:
+            return None
+        return Block(params, mesh.GetDimensions(), mesh)
+    reader = _get_reader(filename)
+    reader.SetFileName(filename)
+    if task is not None:
+        task.observe(reader, stop=.9)
+    reader.Update()
+    if task is not None and task.cancelled:
+        return None
+    mesh = reader.GetOutput()
+    return Block(params, mesh.GetDimensions(), mesh)
+
+
+def write_file(task, data, filename, options):
+    """Write the data given by ``get_file_data`` to a file.
+
+    The progress is reported to the Task if any, the incomplete file is
+    removed if it is cancelled.
+    """
+    if filename.endswith(BLOCKSET_EXTENSION):
+        write_blockset(filename, data, options["compression"])
+        return
+    if filename.endswith(PARTITION_EXTENSION):
+        write_partitioned(filename, data, options["workers"], task)
+        return
+    writer = _get_writer(filename)
+    writer.SetFileName(filename)
+    writer.SetInputData(data)
+    if task is not None:
+        task.observe(writer)
+    writer.Write()
+    # the incomplete file is removed
+    if task is not None and task.cancelled and os.path.exists(filename):
+        os.remove(filename)
+
+
+def get_file_data(block, filename, copy=False):
+    """Return the data of the blocks to write to a file.
+
+    With ``copy``, the data does not share memory with the blocks.
+    """
+    if filename.endswith(BLOCKSET_EXTENSION):
+        return copy_state(block)
+    elif filename.endswith((".vti", PARTITION_EXTENSION)):
+        data = block.as_uniform_grid()
+    else:
+        data = block.as_structured_grid()
+    if copy and data is block.mesh:
+        data = _copy_mesh(data)
+    return data
+
+
+def _copy_mesh(mesh):
+    copy = mesh.NewInstance()
+    copy.DeepCopy(mesh)
+    return copy
+
+
+def _get_reader(filename):
+    if filename.endswith(".vti"):
+        return vtk.vtkXMLImageDataReader()
+    else:
+        return vtk.vtkXMLStructuredGridReader()
+
+
+def _get_writer(filename):
+    if filename.endswith(".vti"):
+        return vtk.vtkXMLImageDataWriter()
+    else:
+        return vtk.vtkXMLStructuredGridWriter()
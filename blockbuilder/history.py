@@ -0,0 +1,127 @@
+"""Module about the history of the edits."""
+
+import numpy as np
+
+
+class Delta(object):
+    """Compact changes of the cells made by one gesture."""
+
+    def __init__(self, ids, old_visible, new_visible, old_colors, new_colors):
+        """Initialize the Delta.
+
+        The colors are only kept for the cells that are visible before,
+        respectively after, the gesture.
+        """
+        self.number_of_cells = len(ids)
+        self.ids = ids.astype(np.min_scalar_type(ids.max()))
+        self.visible = (np.packbits(old_visible), np.packbits(new_visible))
+        self.colors = (old_colors, new_colors)
+        self.nbytes = self.ids.nbytes + sum(
+            array.nbytes for array in self.visible + self.colors)
+
+    def get(self, new):
+        """Return the ids, the visibility and the colors of the cells."""
+        index = int(new)
+        visible = np.unpackbits(self.visible[index],
+                                count=self.number_of_cells).astype(bool)
+        return self.ids.astype(np.int64), visible, self.colors[index]
+
+
+class History(object):
+    """Undo and redo stacks of the edits within a memory budget.
+
+    The newest entry is kept even if it exceeds the budget alone.
+    """
+
+    def __init__(self, budget):
+        """Initialize the History, ``budget`` is in bytes."""
+        self.budget = budget
+        self.undo_stack = list()
+        self.redo_stack = list()
+        self.pending = list()
+        self.grouping = False
+        self.nbytes = 0
+
+    def begin(self):
+        """Group the next edits into a single entry."""
+        self.grouping = True
+
+    def end(self):
+        """Stop grouping the edits."""
+        self.grouping = False
+
+    def track(self, ids, visible, colors):
+        """Keep the state of the cells before they are modified."""
+        if len(ids) > 0:
+            self.pending.append((ids, visible, colors))
+
+    def commit(self, read_cells):
+        """Record the tracked cells that ``read_cells`` reports as changed.
+
+        Return the new Delta or None.
+        """
+        delta = get_delta(self.pending, read_cells)
+        self.pending = list()
+        if delta is None:
+            return None
+        self.undo_stack.append(delta)
+        self.nbytes += delta.nbytes
+        while self.redo_stack:
+            self.nbytes -= self.redo_stack.pop().nbytes
+        # the oldest entries are evicted first
+        while self.nbytes > self.budget and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.pop(0).nbytes
+        return delta
+
+    def undo(self):
+        """Return the Delta of the last entry to revert or None."""
+        if not self.undo_stack:
+            return None
+        delta = self.undo_stack.pop()
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self):
+        """Return the Delta of the last reverted entry or None."""
+        if not self.redo_stack:
+            return None
+        delta = self.redo_stack.pop()
+        self.undo_stack.append(delta)
+        return delta
+
+    def clear(self):
+        """Forget all the entries."""
+        self.undo_stack = list()
+        self.redo_stack = list()
+        self.pending = list()
+        self.nbytes = 0
+
+
+def get_delta(pending, read_cells):
+    """Return the Delta of the tracked cells or None.
+
+    ``pending`` is the list of the tracked ids, visibility and colors,
+    only the cells that ``read_cells`` reports as changed are kept.
+    """
+    if not pending:
+        return None
+    ids, old_visible, old_colors = (
+        np.concatenate(arrays) for arrays in zip(*pending))
+    if len(pending) > 1:
+        # only the first state of each cell is kept
+        ids, first = np.unique(ids, return_index=True)
+        old_visible, old_colors = old_visible[first], old_colors[first]
+    new_visible, new_colors = read_cells(ids)
+    changed = old_colors != new_colors
+    if changed.ndim > 1:
+        changed = np.any(changed, axis=1)
+    changed = (old_visible != new_visible) | (old_visible & changed)
+    if not np.any(changed):
+        return None
+    old_visible = old_visible[changed]
+    new_visible = new_visible[changed]
+    return Delta(
+        ids[changed], old_visible, new_visible,
+        old_colors[changed][old_visible],
+        new_colors[changed][new_visible],
+    )
@@ -3,6 +3,7 @@
 import numpy as np
 import vtk
 from .core_plotter import CorePlotter
+from .picker import GridPicker
 
 
 class InteractivePlotter(CorePlotter):
@@ -93,10 +94,13 @@ class InteractivePlotter(CorePlotter):
         # disable default interactions
         self.set_style(None)
 
-        # enable cell picking
+        # enable picking, the grid picker does not test the actors
         if hasattr(self, "on_pick") and\
            callable(self.on_pick):
-            self.picker = vtk.vtkCellPicker()
+            if self.params["plotter"]["picker"]["value"] == "grid":
+                self.picker = GridPicker()
+            else:
+                self.picker = vtk.vtkCellPicker()
             self.picker.AddObserver(
                 vtk.vtkCommand.EndPickEvent,
                 self.on_pick
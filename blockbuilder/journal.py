@@ -0,0 +1,373 @@
+"""Module about the recovery of the edits after a crash."""
+
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+MAGIC = b"BBJ1"
+HEADER = struct.Struct("<4sQ3I4sI")
+RECORD = struct.Struct("<BII")
+CELLS_RECORD = 0
+PALETTE_RECORD = 1
+
+
+class Session(object):
+    """Snapshots of the blocks and journals of their edits in a directory.
+
+    The snapshot of a generation is followed by the journals of the same
+    and of the newer generations.
+    """
+
+    def __init__(self, path, flush_interval=0.5):
+        """Initialize the Session."""
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.snapshot_file = self.path.joinpath("snapshot.npz")
+        self.lock_file = self.path.joinpath("session.lock")
+        self.lock = None
+        self.flush_interval = flush_interval
+        self.block = None
+        self.journal = None
+        self.revision = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+
+    def acquire(self):
+        """Lock the session, return False if another process holds it.
+
+        The lock is released by the system if the process crashes.
+        """
+        if self.lock is not None:
+            return True
+        lock = open(str(self.lock_file), "ab")
+        if not _lock(lock):
+            lock.close()
+            return False
+        self.lock = lock
+        return True
+
+    def release(self):
+        """Unlock the session."""
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+
+    def exists(self):
+        """Return True if a previous session can be recovered."""
+        return self.snapshot_file.exists()
+
+    def recover(self):
+        """Return the last snapshot and the records that follow it."""
+        snapshot = read_snapshot(self.snapshot_file)
+        records = list()
+        for generation, filename in self._get_journal_files():
+            if generation < snapshot["generation"]:
+                continue
+            journal_generation, dimensions, journal_records = \
+                read_journal(filename)
+            if journal_generation != generation or \
+               not np.array_equal(dimensions, snapshot["dimensions"]):
+                break
+            records.extend(journal_records)
+        return snapshot, records
+
+    def start(self, block, background=False):
+        """Snapshot the blocks and journal their next edits.
+
+        The blocks are copied on the calling thread, only the writing of
+        the snapshot can happen in the background.
+        """
+        self.wait()
+        generation = time.time_ns()
+        state = copy_state(block)
+        previous_journal = self.journal
+        if self.block is not None:
+            self.block.journal = None
+        self.block = block
+        self.revision = block.revision
+        self.journal = Journal(self._get_journal_file(generation), block,
+                               generation, self.flush_interval)
+        block.journal = self.journal
+        if background:
+            self.future = self.executor.submit(
+                self._save, state, generation, previous_journal)
+        else:
+            self._save(state, generation, previous_journal)
+
+    def autosave(self):
+        """Snapshot the blocks in the background if they were modified.
+
+        Return True if a snapshot is started.
+        """
+        if self.block is None or self.block.revision == self.revision:
+            return False
+        if self.future is not None and not self.future.done():
+            return False
+        self.start(self.block, background=True)
+        return True
+
+    def wait(self):
+        """Wait for the snapshot in progress."""
+        if self.future is not None:
+            self.future.result()
+            self.future = None
+
+    def stop(self):
+        """Stop journaling and unlock, the files are kept for the recovery."""
+        self.wait()
+        if self.journal is not None:
+            self.journal.close()
+            self.block.journal = None
+            self.journal = None
+        self.block = None
+        self.release()
+
+    def close(self):
+        """Stop journaling and remove the files."""
+        self.stop()
+        self.executor.shutdown()
+        for _, filename in self._get_journal_files():
+            filename.unlink()
+        if self.snapshot_file.exists():
+            self.snapshot_file.unlink()
+
+    def _save(self, state, generation, previous_journal):
+        # the previous journal is complete before the snapshot replaces it
+        if previous_journal is not None:
+            previous_journal.close()
+        write_snapshot(self.snapshot_file, state, generation)
+        for journal_generation, filename in self._get_journal_files():
+            if journal_generation < generation:
+                filename.unlink()
+
+    def _get_journal_file(self, generation):
+        return self.path.joinpath("journal-{}.bin".format(generation))
+
+    def _get_journal_files(self):
+        # the journals sorted by generation
+        journal_files = list()
+        for filename in self.path.glob("journal-*.bin"):
+            generation = filename.stem.split("-")[-1]
+            if generation.isdigit():
+                journal_files.append((int(generation), filename))
+        return sorted(journal_files)
+
+
+class Journal(object):
+    """Append-only file of the edits, written on a background thread.
+
+    The records arriving within ``flush_interval`` seconds are written
+    together and synchronized to the disk with a single fsync. The
+    ``generation`` identifies the snapshot that the records follow.
+    """
+
+    def __init__(self, filename, block, generation, flush_interval=0.5):
+        """Initialize the Journal and truncate the file."""
+        self.filename = str(filename)
+        self.generation = generation
+        self.flush_interval = flush_interval
+        self.dimensions = np.asarray(block.dimensions)
+        self.color_dtype = np.dtype(block.color_dtype)
+        self.color_shape = np.shape(block.cell_color)
+        self.id_dtype = _id_dtype(self.dimensions)
+        self.queue = queue.Queue()
+        self.file = open(self.filename, "wb")
+        self.file.write(HEADER.pack(
+            MAGIC, self.generation, *self.dimensions.tolist(),
+            self.color_dtype.str.encode("ascii"),
+            int(np.prod(self.color_shape)) if self.color_shape else 0,
+        ))
+        # the header is synchronized with the first records
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, delta, new=True):
+        """Journal the state of the cells before or after a delta."""
+        self.queue.put((CELLS_RECORD, (delta, new)))
+
+    def append_palette(self, palette):
+        """Journal the palette of the materials."""
+        self.queue.put((PALETTE_RECORD, palette))
+
+    def flush(self):
+        """Wait until the appended records are on the disk."""
+        self.queue.join()
+
+    def close(self):
+        """Write the remaining records and close the file."""
+        if self.file.closed:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def _run(self):
+        closing = False
+        while not closing:
+            records = [self.queue.get()]
+            # the records of the interval share the same fsync
+            deadline = time.monotonic() + self.flush_interval
+            while records[-1] is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    records.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            for record in records:
+                if record is None:
+                    closing = True
+                else:
+                    self.file.write(self._encode(*record))
+            self._sync()
+            for _ in records:
+                self.queue.task_done()
+
+    def _encode(self, kind, data):
+        if kind == CELLS_RECORD:
+            delta, new = data
+            ids, visible, colors = delta.get(new)
+            payload = b"".join((
+                struct.pack("<Q", len(ids)),
+                ids.astype(self.id_dtype).tobytes(),
+                np.packbits(visible).tobytes(),
+                np.ascontiguousarray(colors,
+                                     dtype=self.color_dtype).tobytes(),
+            ))
+        else:
+            payload = np.asarray(data, dtype="<f8").tobytes()
+        return RECORD.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+
+def _lock(fp):
+    # exclusive lock of the file that does not wait
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(fp.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def read_journal(filename):
+    """Return the generation, the dimensions and the records of a journal.
+
+    The records are ``(CELLS_RECORD, (ids, visible, colors))`` or
+    ``(PALETTE_RECORD, palette)``, the reading stops at the first
+    incomplete or corrupted record.
+    """
+    with open(str(filename), "rb") as fp:
+        data = fp.read()
+    if len(data) < HEADER.size:
+        return None, None, list()
+    magic, generation, nx, ny, nz, dtype, components = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        return None, None, list()
+    dimensions = np.array([nx, ny, nz])
+    color_dtype = np.dtype(dtype.decode("ascii").strip("\x00"))
+    color_shape = (components,) if components else ()
+    id_dtype = _id_dtype(dimensions)
+    records = list()
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        kind, size, checksum = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + size]
+        if len(payload) < size or zlib.crc32(payload) != checksum:
+            break
+        offset += size
+        if kind == CELLS_RECORD:
+            number_of_cells, = struct.unpack_from("<Q", payload)
+            position = 8
+            ids = np.frombuffer(payload, dtype=id_dtype,
+                                count=number_of_cells, offset=position)
+            position += ids.nbytes
+            visible = np.unpackbits(
+                np.frombuffer(payload, dtype=np.uint8, offset=position,
+                              count=(number_of_cells + 7) // 8),
+                count=number_of_cells).astype(bool)
+            position += (number_of_cells + 7) // 8
+            colors = np.frombuffer(payload, dtype=color_dtype,
+                                   offset=position)
+            colors = colors.reshape((-1,) + color_shape)
+            records.append((kind, (ids.astype(np.int64), visible, colors)))
+        else:
+            records.append((kind, np.frombuffer(payload, dtype="<f8")
+                            .reshape(-1, 3)))
+    return generation, dimensions, records
+
+
+def copy_state(block):
+    """Return a copy of the visible cells of the blocks and their palette."""
+    ids, colors = block.get_visible_cells()
+    if block.palette is None:
+        palette = np.zeros((0, 3))
+    else:
+        palette = block.palette.copy()
+    return {
+        "dimensions": block.dimensions.copy(),
+        "color_type": block.color_type,
+        "ids": ids,
+        "colors": colors,
+        "palette": palette,
+    }
+
+
+def write_snapshot(filename, state, generation):
+    """Write a copy of the blocks given by ``copy_state``."""
+    filename = str(filename)
+    # the previous snapshot is replaced only once complete
+    with open(filename + ".tmp", "wb") as fp:
+        np.savez(fp, generation=generation, **state)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(filename + ".tmp", filename)
+
+
+def read_snapshot(filename):
+    """Return the content of a snapshot as a dictionary."""
+    with np.load(str(filename)) as snapshot:
+        return {
+            "generation": int(snapshot["generation"]),
+            "dimensions": snapshot["dimensions"],
+            "color_type": str(snapshot["color_type"]),
+            "ids": snapshot["ids"],
+            "colors": snapshot["colors"],
+            "palette": snapshot["palette"],
+        }
+
+
+def replay(block, snapshot, records):
+    """Restore the blocks from a snapshot and the following records."""
+    with block.transaction():
+        if len(snapshot["palette"]) > 0:
+            block.set_palette(snapshot["palette"])
+        ids = snapshot["ids"]
+        block.set_cells(ids, np.ones(len(ids), dtype=bool),
+                        snapshot["colors"])
+        for kind, data in records:
+            if kind == CELLS_RECORD:
+                block.set_cells(*data)
+            else:
+                block.set_palette(data)
+
+
+def _id_dtype(dimensions):
+    number_of_cells = int(np.prod(np.asarray(dimensions) - 1))
+    return np.min_scalar_type(max(number_of_cells - 1, 0)).newbyteorder("<")
@@ -1,14 +1,17 @@
 """Module about the main application."""
 
+import copy
 import enum
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import vtk
 
 from qtpy import QtCore
-from qtpy.QtCore import QSize
+from qtpy.QtCore import QSize, QTimer
 from qtpy.QtGui import QIcon
-from qtpy.QtWidgets import (QToolButton, QButtonGroup,
-                            QFileDialog)
+from qtpy.QtWidgets import (QToolButton, QButtonGroup, QFileDialog,
+                            QInputDialog, QMessageBox, QProgressDialog)
 
 from .utils import DefaultFunction
 from .element import ElementId
@@ -16,10 +19,17 @@ from .selector import Symmetry, SymmetrySelector
 from .grid import Grid
 from .plane import Plane
 from .block import Block
+from .journal import Session, replay
+from .files import read_file, write_file, get_file_data
+from .task import Task
+from .store import VersionStore
+from .params import get_session_path, get_versions_path
 from .intersection import Intersection
+from .picker import GridPicker, get_ray, intersect_plane
 from .interactive_plotter import InteractivePlotter
 from .setting import SettingDialog, ColorButton
 from .help import HelpDialog
+from .icons import resources
 
 
 @enum.unique
@@ -62,12 +72,27 @@ class MainPlotter(InteractivePlotter):
         self.button_pressed = False
         self.button_released = False
         self.area_selection = False
+        self.pick_state = None
+        self.stroke_coords = None
+        self.stroke_cells = set()
         self.floor = None
         self.ceiling = None
         self.icons = None
         self.toolbar = None
         self.current_block_mode = None
         self.mode_functions = None
+        self.session = None
+        self.autosave_timer = None
+        self.version_store = None
+        self.versions = dict()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.task_done = None
+        self.progress_dialog = None
+        self.error_dialog = None
+        self.task_timer = QTimer(self)
+        self.task_timer.setInterval(50)
+        self.task_timer.timeout.connect(self._update_task)
         self.set_dimensions(self.dimensions)
 
         # configuration
@@ -78,6 +103,7 @@ class MainPlotter(InteractivePlotter):
         self.load_icons()
         self.load_toolbar()
         self.load_dialogs()
+        self.load_session()
         self.selector.hide()
         self.update_camera()
         self.render_scene()
@@ -105,6 +131,78 @@ class MainPlotter(InteractivePlotter):
         x, y = vtk_picker.GetEventPosition()
         self.picker.Pick(x, y, 0, self.renderer)
 
+    def on_key_press(self, vtk_picker, event):
+        """Process key press events."""
+        super().on_key_press(vtk_picker, event)
+        key = self.interactor.GetKeySym()
+        if key == self.params["keybinding"]["undo"]["value"]:
+            self.undo()
+        if key == self.params["keybinding"]["redo"]["value"]:
+            self.redo()
+        if key == self.params["keybinding"]["save_version"]["value"]:
+            self.save_version()
+        if key == self.params["keybinding"]["show_versions"]["value"]:
+            self.show_versions()
+
+    def undo(self):
+        """Undo the last edit of the blocks."""
+        if self.block.undo():
+            self.render_scene()
+
+    def redo(self):
+        """Redo the last undone edit of the blocks."""
+        if self.block.redo():
+            self.render_scene()
+
+    def save_version(self):
+        """Store a version of the blocks and return its id."""
+        return self._get_version_store().save(self.block)
+
+    def show_versions(self):
+        """Open the list of the stored versions to check one out."""
+        store = self._get_version_store()
+        self.versions = dict()
+        # the newest versions first
+        for version in reversed(store.get_versions()):
+            saved = time.localtime(store.load(version)["time"])
+            label = "{} ({})".format(
+                time.strftime("%Y-%m-%d %H:%M:%S", saved), version[:8])
+            self.versions[label] = version
+        if not self.versions:
+            self.show_error("There is no stored version, press '{}' to "
+                            "save one".format(
+                                self.params["keybinding"]["save_version"]
+                                ["value"]))
+            return
+        self.version_dialog.setComboBoxItems(list(self.versions))
+        self.version_dialog.show()
+
+    def checkout_version(self, version):
+        """Replace the blocks by a stored version."""
+        store = self._get_version_store()
+        dimensions = store.load(version)["dimensions"]
+        if not np.array_equal(dimensions, self.block.dimensions):
+            self._resize(dimensions)
+            self.pick_state = None
+            self.update_camera()
+        store.checkout(version, self.block)
+        # the checkout is not journaled, the snapshot starts after it
+        if self.session is not None:
+            self.session.start(self.block, background=True)
+        self.render_scene()
+
+    def _checkout_selected_version(self, label):
+        try:
+            self.checkout_version(self.versions[label])
+        except ValueError as error:
+            self.show_error(str(error))
+
+    def _get_version_store(self):
+        # the store is created when it is first used
+        if self.version_store is None:
+            self.version_store = VersionStore(get_versions_path())
+        return self.version_store
+
     def on_mouse_wheel_forward(self, vtk_picker, event):
         """Process mouse wheel forward events."""
         tr = np.array([0., 0., self.unit])
@@ -123,6 +221,8 @@ class MainPlotter(InteractivePlotter):
         """Process mouse left button press events."""
         x, y = vtk_picker.GetEventPosition()
         self.button_pressed = True
+        # the edits until the release are undone together
+        self.block.begin_gesture()
         self.picker.Pick(x, y, 0, self.renderer)
 
     def on_mouse_left_release(self, vtk_picker, event):
@@ -130,7 +230,13 @@ class MainPlotter(InteractivePlotter):
         x, y = vtk_picker.GetEventPosition()
         self.button_released = True
         self.picker.Pick(x, y, 0, self.renderer)
+        # the release is handled by the pick
+        self.button_released = False
         self.button_pressed = False
+        # the stroke ends with the button release
+        self.stroke_coords = None
+        self.stroke_cells = set()
+        self.block.end_gesture()
 
     def on_pick(self, vtk_picker, event):
         """Process pick events."""
@@ -147,7 +253,12 @@ class MainPlotter(InteractivePlotter):
 
     def add_element(self, element):
         """Add an element to the scene."""
-        actor = self.add_mesh(**element.plotting)
+        if element.element_id is ElementId.BLOCK:
+            # the blocks are rendered by chunks
+            actor = element.load_actor(self.create_actor)
+            self.add_actor(actor)
+        else:
+            actor = self.add_mesh(**element.plotting)
         element.actor = actor
         actor.element_id = element.element_id
 
@@ -180,6 +291,8 @@ class MainPlotter(InteractivePlotter):
         """Load the default elements."""
         self.block = Block(self.params, self.dimensions)
         self.grid = Grid(self.params, self.dimensions)
+        if isinstance(self.picker, GridPicker):
+            self.picker.grid = self.grid
         self.plane = Plane(self.params, self.dimensions)
         self.selector = SymmetrySelector(self.params, self.dimensions)
 
@@ -193,6 +306,7 @@ class MainPlotter(InteractivePlotter):
         To automatically generate the resource file in ``blockbuilder/icons``:
         pyrcc5 -o resources.py blockbuilder.qrc
         """
+        resources.qInitResources()
         self.icons = dict()
         for category in (BlockMode, Toggle, Symmetry, Action):
             for element in category:
@@ -277,24 +391,108 @@ class MainPlotter(InteractivePlotter):
         self.toolbar.addSeparator()
         self._add_toolbar_actions()
 
+    def load_session(self):
+        """Recover the previous session and journal the new edits."""
+        if not self.params["session"]["journal"]:
+            return
+        self.session = Session(
+            get_session_path(),
+            flush_interval=self.params["session"]["flush_interval"])
+        if not self.session.acquire():
+            warnings.warn("The session is used by another instance, the "
+                          "edits are not journaled")
+            self.session = None
+            return
+        # the files are only left by a session that did not close
+        if self.session.exists():
+            try:
+                self.recover_session()
+            except ValueError as error:
+                # the files are kept for a later recovery
+                warnings.warn("The session cannot be recovered: "
+                              "{}".format(error))
+                self.session.release()
+                self.session = None
+                return
+        self.session.start(self.block)
+        autosave_interval = self.params["session"]["autosave_interval"]
+        if autosave_interval > 0:
+            self.autosave_timer = QTimer(self)
+            self.autosave_timer.timeout.connect(self.autosave)
+            self.autosave_timer.start(int(autosave_interval * 1000))
+
+    def recover_session(self):
+        """Restore the blocks from the snapshot and the journals."""
+        snapshot, records = self.session.recover()
+        if not np.array_equal(snapshot["dimensions"], self.block.dimensions):
+            self._resize(snapshot["dimensions"])
+        if snapshot["color_type"] == self.block.color_type:
+            replay(self.block, snapshot, records)
+        else:
+            # the colors are converted by merging the recovered blocks
+            params = copy.deepcopy(self.params)
+            params["block"]["color_type"]["value"] = snapshot["color_type"]
+            params["block"]["history_budget"] = 0
+            params["block"]["paging"]["budget"] = 0
+            recovered_block = Block(params, snapshot["dimensions"])
+            replay(recovered_block, snapshot, records)
+            self.block.merge(recovered_block)
+        if self.block.history is not None:
+            self.block.history.clear()
+
+    def autosave(self):
+        """Snapshot the blocks in the background if they were modified."""
+        # the blocks are copied between the gestures only
+        if self.session is None or self.button_pressed:
+            return
+        self.session.autosave()
+
+    def closeEvent(self, event):
+        """Close the session, there is nothing left to recover."""
+        if self.task is not None:
+            self.task.cancel()
+            self.wait_task()
+        self.executor.shutdown()
+        if self.autosave_timer is not None:
+            self.autosave_timer.stop()
+        if self.session is not None:
+            self.session.close()
+        # the paged chunks are kept for the next session
+        self.block.flush()
+        super().closeEvent(event)
+
     def load_dialogs(self):
         """Load the dialogs."""
         # export dialog
         self.export_dialog = QFileDialog(self)
         self.export_dialog.setWindowTitle("Export")
-        self.export_dialog.setNameFilter("Blockset (*.vts *.vtk)")
+        self.export_dialog.setNameFilter(
+            "Blockset (*.bb *.vts *.pvts *.vti *.vtk)")
         self.export_dialog.setWindowIcon(self.icons[Action.EXPORT])
+        self.export_dialog.fileSelected.connect(
+            lambda filename: self._export(filename, background=True))
         # XXX: Fails on CI if modal
         # self.export_dialog.setModal(True)
 
         # import dialog
         self.import_dialog = QFileDialog(self)
-        self.import_dialog.setNameFilter("Blockset (*.vts *.vtk)")
+        self.import_dialog.setNameFilter(
+            "Blockset (*.bb *.vts *.pvts *.vti *.vtk)")
         self.import_dialog.setWindowTitle("Import")
         self.import_dialog.setWindowIcon(self.icons[Action.IMPORT])
+        self.import_dialog.fileSelected.connect(
+            lambda filename: self._import(filename, background=True))
         # XXX: Fails on CI if modal
         # self.import_dialog.setModal(True)
 
+        # version dialog
+        self.version_dialog = QInputDialog(self)
+        self.version_dialog.setWindowTitle("Versions")
+        self.version_dialog.setLabelText("Check out the version:")
+        self.version_dialog.setComboBoxEditable(False)
+        self.version_dialog.textValueSelected.connect(
+            self._checkout_selected_version)
+
         # setting dialog
         self.setting_dialog = SettingDialog(self.params, self)
         self.setting_dialog.setWindowIcon(self.icons[Action.SETTING])
@@ -364,27 +562,28 @@ class MainPlotter(InteractivePlotter):
 
     def use_delete_mode(self, vtk_picker):
         """Use the delete mode."""
-        self._build_or_delete(vtk_picker, self.block.remove)
+        self._build_or_delete(vtk_picker, self.block.remove,
+                              self.block.remove_cells)
 
     def use_build_mode(self, vtk_picker):
         """Use the build mode."""
-        self._build_or_delete(vtk_picker, self.block.add)
+        self._build_or_delete(vtk_picker, self.block.add,
+                              self.block.add_cells)
 
-    def _build_or_delete(self, vtk_picker, operation):
+    def _build_or_delete(self, vtk_picker, operation, cells_operation):
         intersection = Intersection(vtk_picker)
-        if not intersection.exist():
-            self.selector.hide()
-            self.selector.reset_area()
-            self.render_scene()
+        coords = self._pick_coords(vtk_picker, intersection)
+        # most of the mouse moves stay over the same cell
+        pick_state = self._get_pick_state(coords, intersection)
+        if pick_state == self.pick_state and not self.button_released:
             return
-
-        if not intersection.element(ElementId.GRID):
+        self.pick_state = pick_state
+        if coords is None:
+            if not intersection.exist():
+                self.selector.hide()
+                self.selector.reset_area()
+                self.render_scene()
             return
-
-        grid_ipoint = intersection.point(ElementId.GRID)
-
-        coords = np.floor(grid_ipoint / self.unit)
-        coords[2] = self.grid.origin[2] / self.unit
         self.coords = coords
 
         self.selector.select(coords)
@@ -394,12 +593,14 @@ class MainPlotter(InteractivePlotter):
             if self.button_released:
                 first_set = self.selector.get_first_coords() is not None
                 last_set = self.selector.get_last_coords() is not None
-                if first_set and last_set:
-                    for area in self.selector.selection_area():
-                        operation(area)
-                elif first_set and not last_set:
-                    for coords in self.selector.selection():
-                        operation(coords)
+                # the symmetric copies are updated at once
+                with self.block.transaction():
+                    if first_set and last_set:
+                        for area in self.selector.selection_area():
+                            operation(area)
+                    elif first_set and not last_set:
+                        for coords in self.selector.selection():
+                            operation(coords)
                 self.selector.reset_area()
                 self.button_released = False
             elif self.button_pressed:
@@ -414,11 +615,81 @@ class MainPlotter(InteractivePlotter):
                     self.selector.select_area(area)
         else:
             if self.button_pressed:
-                for coords in self.selector.selection():
-                    operation(coords)
+                self._paint_stroke(coords, cells_operation)
 
         self.render_scene()
 
+    def _pick_stroke_coords(self, ray_origin, ray_direction):
+        # a stroke stays on the layer where it started, its plane is the
+        # one of the grid so that the first cell is the one picked
+        layer = self.stroke_coords[2]
+        position = intersect_plane(ray_origin, ray_direction,
+                                   layer * self.unit)
+        if position is None:
+            return None
+        coords = np.floor(position / self.unit)
+        coords[2] = layer
+        if np.any(coords < 0) or np.any(coords >= self.block.dimensions - 1):
+            return None
+        return coords
+
+    def _paint_stroke(self, coords, cells_operation):
+        # the line of cells since the previous pick of the stroke is
+        # painted at once, without the cells already painted
+        coords = coords.astype(np.int64)
+        if self.stroke_coords is None:
+            cells = coords[np.newaxis]
+        else:
+            cells = _get_line(self.stroke_coords, coords)
+        self.stroke_coords = coords
+        cells = np.concatenate(self.selector.symmetric_coords(cells))
+        new_cells = list()
+        for cell in map(tuple, cells.tolist()):
+            if cell not in self.stroke_cells:
+                self.stroke_cells.add(cell)
+                new_cells.append(cell)
+        if new_cells:
+            cells_operation(new_cells)
+
+    def _get_pick_state(self, coords, intersection):
+        if coords is not None:
+            coords = tuple(coords)
+        return (
+            coords,
+            intersection.exist(),
+            self.current_block_mode,
+            self.selector.symmetry,
+            self.area_selection,
+            self.button_pressed,
+        )
+
+    def _pick_coords(self, vtk_picker, intersection):
+        # the nearest of the grid and of the faces of the blocks is picked
+        x, y = vtk_picker.GetSelectionPoint()[:2]
+        ray_origin, ray_direction = get_ray(self.renderer, x, y)
+        if self.stroke_coords is not None:
+            return self._pick_stroke_coords(ray_origin, ray_direction)
+        grid_distance = np.inf
+        if intersection.exist() and intersection.element(ElementId.GRID):
+            grid_ipoint = intersection.point(ElementId.GRID)
+            grid_distance = np.dot(grid_ipoint - ray_origin, ray_direction) \
+                / np.dot(ray_direction, ray_direction)
+        hit = self.block.raycast(ray_origin, ray_direction)
+        if hit is not None and hit[2] < grid_distance:
+            coords, normal, _ = hit
+            # the blocks are built onto the face that was hit
+            if self.current_block_mode is BlockMode.BUILD:
+                coords = coords + normal
+                if np.any(coords < 0) or \
+                   np.any(coords >= self.block.dimensions - 1):
+                    return None
+            return coords.astype(np.float64)
+        if np.isinf(grid_distance):
+            return None
+        coords = np.floor(grid_ipoint / self.unit)
+        coords[2] = self.grid.origin[2] / self.unit
+        return coords
+
     def action_reset(self, unused):
         """Reset the block properties."""
         del unused
@@ -429,72 +700,147 @@ class MainPlotter(InteractivePlotter):
 
     def action_import(self, value=None):
         """Import an external blockset."""
-        def _import(filename):
-            if len(filename) == 0:
-                raise ValueError("The input filename string is empty")
-            reader = vtk.vtkXMLStructuredGridReader()
-            reader.SetFileName(filename)
-            reader.Update()
-            mesh = reader.GetOutput()
-            dimensions = mesh.GetDimensions()
-            imported_block = Block(self.params, dimensions, mesh)
-            if all(np.equal(dimensions, self.dimensions)):
-                self.block.merge(imported_block)
-            else:
-                final_dimensions = [
-                    self.block.dimensions,
-                    imported_block.dimensions
-                ]
-                final_dimensions = np.max(final_dimensions, axis=0)
-
-                if all(np.equal(self.dimensions, final_dimensions)):
-                    self.block.merge(imported_block)
-                else:
-                    self.remove_elements()
-
-                    old_block = self.block
-                    self.set_dimensions(final_dimensions)
-                    self.load_elements()
-                    self.add_elements()
-                    # restore edge visibility
-                    self.block.toggle_edges(old_block.show_edges)
-                    # restore block mode
-                    self.set_block_mode()
-                    self.block.merge(old_block)
-                    self.block.merge(imported_block)
-
-                    self.selector.hide()
-                    self.update_camera()
-                self.render_scene()
-
         if isinstance(value, bool):
-            self.import_dialog.fileSelected.connect(_import)
             self.import_dialog.show()
         elif isinstance(value, str):
-            _import(value)
+            self._import(value)
         else:
             raise TypeError("Expected type for ``filename``is ``str``"
                             " but {} was given.".format(type(value)))
 
+    def _import(self, filename, background=False):
+        if len(filename) == 0:
+            raise ValueError("The input filename string is empty")
+        if background:
+            self.start_task("Importing {}".format(filename),
+                            read_file, self.params, filename,
+                            done=self._merge_blockset)
+        else:
+            self._merge_blockset(read_file(None, self.params, filename))
+
+    def _merge_blockset(self, imported_block):
+        dimensions = imported_block.dimensions
+        if all(np.equal(dimensions, self.dimensions)):
+            self.block.merge(imported_block)
+        else:
+            final_dimensions = [
+                self.block.dimensions,
+                imported_block.dimensions
+            ]
+            final_dimensions = np.max(final_dimensions, axis=0)
+
+            if all(np.equal(self.dimensions, final_dimensions)):
+                self.block.merge(imported_block)
+            else:
+                old_block = self._resize(final_dimensions)
+                # only the import is recorded in the new history
+                history = self.block.history
+                with self.block.transaction():
+                    self.block.history = None
+                    self.block.merge(old_block)
+                    self.block.history = history
+                    self.block.merge(imported_block)
+                # the journal follows the new dimensions
+                if self.session is not None:
+                    self.session.start(self.block, background=True)
+
+                self.selector.hide()
+                self.pick_state = None
+                self.update_camera()
+        self.render_scene()
+
+    def _resize(self, dimensions):
+        # replace the elements by new ones with the given dimensions
+        cache = self.block.cache
+        if cache is not None and not cache.temporary:
+            # the new blocks would share the chunks stored on the disk
+            raise ValueError("The blocks paged to {} cannot be "
+                             "resized".format(cache.path))
+        self.remove_elements()
+        old_block = self.block
+        self.set_dimensions(dimensions)
+        self.load_elements()
+        self.add_elements()
+        # restore edge visibility
+        self.block.toggle_edges(old_block.show_edges)
+        # restore block mode
+        self.set_block_mode()
+        return old_block
+
     def action_export(self, value=None):
         """Export the internal blockset."""
-        def _export(filename):
-            if len(filename) == 0:
-                raise ValueError("The output filename string is empty")
-            writer = vtk.vtkXMLStructuredGridWriter()
-            writer.SetFileName(filename)
-            writer.SetInputData(self.block.mesh)
-            writer.Write()
-
         if isinstance(value, bool):
-            self.export_dialog.fileSelected.connect(_export)
             self.export_dialog.show()
         elif isinstance(value, str):
-            _export(value)
+            self._export(value)
         else:
             raise TypeError("Expected type for ``filename``is ``str``"
                             " but {} was given.".format(type(value)))
 
+    def _export(self, filename, background=False):
+        if len(filename) == 0:
+            raise ValueError("The output filename string is empty")
+        options = self.params["blockset"]
+        if background:
+            # the blocks can be edited while the copy is written
+            data = get_file_data(self.block, filename, copy=True)
+            self.start_task("Exporting {}".format(filename),
+                            write_file, data, filename, options)
+        else:
+            data = get_file_data(self.block, filename)
+            write_file(None, data, filename, options)
+
+    def start_task(self, title, function, *args, done=None):
+        """Run the function on the worker thread and show its progress.
+
+        ``done`` is called on the main thread with the result of the
+        function unless the task is cancelled.
+        """
+        if self.task is not None:
+            raise RuntimeError("A task is already running")
+        self.task = Task(self.executor, function, *args)
+        self.task_done = done
+        self.progress_dialog = QProgressDialog(title, "Cancel", 0, 100, self)
+        self.progress_dialog.setWindowModality(QtCore.Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(
+            int(self.params["builder"]["progress_delay"] * 1000))
+        self.progress_dialog.canceled.connect(self.task.cancel)
+        self.task_timer.start()
+
+    def wait_task(self):
+        """Wait for the task in progress and apply its result."""
+        if self.task is not None:
+            self.task.future.exception()
+            self._update_task()
+
+    def _update_task(self):
+        if not self.task.done():
+            # the dialog closes itself when the maximum is reached
+            self.progress_dialog.setValue(min(int(self.task.progress * 100),
+                                              99))
+            return
+        self.task_timer.stop()
+        self.progress_dialog.reset()
+        self.progress_dialog.deleteLater()
+        self.progress_dialog = None
+        task, done = self.task, self.task_done
+        self.task = None
+        self.task_done = None
+        # the errors of the worker are reported instead of being raised
+        # in the event loop
+        try:
+            result = task.result()
+            if result is not None and done is not None:
+                done(result)
+        except Exception as error:
+            self.show_error(str(error))
+
+    def show_error(self, message):
+        """Report an error in a dialog that does not block."""
+        self.error_dialog = QMessageBox(QMessageBox.Warning, "Error",
+                                        message, QMessageBox.Ok, self)
+        self.error_dialog.show()
+
     def action_setting(self, value=None):
         """Open the settings menu."""
         del value
@@ -515,6 +861,17 @@ class MainPlotter(InteractivePlotter):
         self.render_scene()
 
 
+def _get_line(start, stop):
+    # the cells of the line between start and stop, without gaps
+    start = np.asarray(start, dtype=np.int64)
+    stop = np.asarray(stop, dtype=np.int64)
+    length = int(np.max(np.abs(stop - start)))
+    if length == 0:
+        return start[np.newaxis]
+    steps = np.arange(length + 1)[:, np.newaxis] / length
+    return np.floor(start + steps * (stop - start) + 0.5).astype(np.int64)
+
+
 def _get_toolbar_area(area, areas):
     if not isinstance(area, str):
         raise TypeError("Expected type for ``area`` is ``str`` but {}"
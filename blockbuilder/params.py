@@ -13,6 +13,12 @@ rcParams = {
         "window_size": [1280, 720],
         "show_edges": True,
         "line_width": 3,
+        "max_fps": 60,
+        "picker": {
+            "dropdown": True,
+            "range": ["grid", "cell"],
+            "value": "grid",
+        },
         "advanced": False,
         "background": {
             "color": {
@@ -44,6 +50,7 @@ rcParams = {
     },
     "block": {
         "color_array_name": "color",
+        "palette_array_name": "palette",
         "color": [.7, .7, .7],
         "edge": {
             "color": [.0, .0, .0],
@@ -53,6 +60,23 @@ rcParams = {
             "range": ["external", "internal"],
             "value": "external",
         },
+        "chunk_size": 16,
+        "greedy_meshing": False,
+        "history_budget": 64,
+        "paging": {
+            "budget": 0,
+            "path": "",
+        },
+        "storage": {
+            "dropdown": True,
+            "range": ["implicit", "explicit", "sparse"],
+            "value": "implicit",
+        },
+        "color_type": {
+            "dropdown": True,
+            "range": ["uint8", "float", "palette"],
+            "value": "uint8",
+        },
     },
     "camera": {
         "view_up": [0, 0, 1],
@@ -92,6 +116,26 @@ rcParams = {
             "range": ["s"],
             "value": "s",
         },
+        "undo": {
+            "dropdown": True,
+            "range": ["u"],
+            "value": "u",
+        },
+        "redo": {
+            "dropdown": True,
+            "range": ["r"],
+            "value": "r",
+        },
+        "save_version": {
+            "dropdown": True,
+            "range": ["v"],
+            "value": "v",
+        },
+        "show_versions": {
+            "dropdown": True,
+            "range": ["l"],
+            "value": "l",
+        },
     },
     "builder": {
         "toggles": {
@@ -106,16 +150,27 @@ rcParams = {
             },
             "icon_size": [36, 36],
         },
+        "progress_delay": 0.5,
     },
     "app": {
         "name": "BlockBuilder",
         "icon": "blockbuilder.svg",
     },
+    "blockset": {
+        "compression": False,
+        "workers": 0,
+    },
+    "session": {
+        "journal": True,
+        "flush_interval": 0.5,
+        "autosave_interval": 60,
+    },
     "setting": {
         "interface": ["plotter", "builder"],
         "scene": ["dimensions", "grid", "plane", "selector", "block"],
         "keys": ["keybinding"],
-        "dev": ["unit", "origin", "element", "camera", "app"],
+        "dev": ["unit", "origin", "element", "camera", "blockset", "session",
+                "app"],
     },
 }
 
@@ -129,6 +184,16 @@ def get_config_path():
     return home_path.joinpath(config_name)
 
 
+def get_session_path():
+    """Get the directory of the session recovery files."""
+    return get_config_path().with_suffix(".session")
+
+
+def get_versions_path():
+    """Get the directory of the stored versions of the blocks."""
+    return get_config_path().with_suffix(".versions")
+
+
 def write_params(params):
     """Write the default configuration settings."""
     config_path = get_config_path()
@@ -0,0 +1,255 @@
+"""Module about the blocksets partitioned in pieces written in parallel."""
+
+import multiprocessing
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from xml.etree import ElementTree
+import numpy as np
+import vtk
+from vtk.util.numpy_support import vtk_to_numpy, numpy_to_vtk
+
+from .utils import (add_mesh_cell_array, get_mesh_ghost_array,
+                    get_structured_grid, get_uniform_grid)
+
+EXTENSION = ".pvts"
+GHOST_ARRAY_NAME = vtk.vtkDataSetAttributes.GhostArrayName()
+
+
+def write_partitioned(filename, mesh, workers=0, task=None):
+    """Write a vtkUniformGrid as slabs of cells in parallel processes.
+
+    Each slab is a .vts piece and the .pvts file is the index of the
+    pieces. All the cores are used if ``workers`` is 0. The directory of
+    the pieces is only replaced if it contains pieces alone.
+    """
+    filename = Path(filename)
+    dimensions = np.asarray(mesh.GetDimensions())
+    origin = np.asarray(mesh.GetOrigin())
+    spacing = np.asarray(mesh.GetSpacing())
+    color_array = mesh.GetCellData().GetScalars()
+    color_name = color_array.GetName()
+    colors = _as_slices(vtk_to_numpy(color_array), dimensions)
+    ghosts = _as_slices(vtk_to_numpy(get_mesh_ghost_array(mesh)), dimensions)
+    field_arrays = _get_field_arrays(mesh)
+    # the pieces are stored next to the index like ParaView does
+    piece_directory = filename.with_suffix("")
+    if piece_directory.exists() and not _is_piece_directory(piece_directory):
+        raise ValueError("{} is not a directory of pieces".format(
+            piece_directory))
+    # the pieces are written in a new directory that replaces the previous
+    # one once complete
+    written_directory = piece_directory.with_name(".{}-{}".format(
+        piece_directory.name, uuid.uuid4().hex))
+    written_directory.mkdir()
+    try:
+        slabs = _get_slabs(dimensions[2] - 1, _get_workers(workers))
+        pieces = list()
+        arguments = list()
+        for index, (start, stop) in enumerate(slabs):
+            piece = "{}_{}.vts".format(piece_directory.name, index)
+            extent = [0, dimensions[0] - 1, 0, dimensions[1] - 1,
+                      start, stop]
+            pieces.append((extent, "{}/{}".format(piece_directory.name,
+                                                  piece)))
+            arguments.append((
+                str(written_directory.joinpath(piece)), extent, origin,
+                spacing, ghosts[start:stop], colors[start:stop], color_name,
+                field_arrays,
+            ))
+        if not _run(_write_piece, arguments, len(slabs), task):
+            return
+        if piece_directory.exists():
+            shutil.rmtree(str(piece_directory))
+        os.rename(str(written_directory), str(piece_directory))
+    finally:
+        if written_directory.exists():
+            shutil.rmtree(str(written_directory))
+    data_arrays = [
+        (color_name, colors.dtype, np.prod(colors.shape[3:], dtype=int)),
+        (GHOST_ARRAY_NAME, ghosts.dtype, 1),
+    ]
+    _write_index(filename, dimensions, color_name, data_arrays, pieces)
+
+
+def read_partitioned(filename, workers=0, task=None):
+    """Return the vtkUniformGrid of a .pvts file read in parallel processes.
+
+    Return None if the task is cancelled.
+    """
+    filename = Path(filename)
+    root = ElementTree.parse(str(filename)).getroot()
+    grid = root.find("PStructuredGrid")
+    whole_extent = np.asarray(grid.get("WholeExtent").split(), dtype=int)
+    arguments = [
+        (str(filename.parent.joinpath(piece.get("Source"))),)
+        for piece in grid.iter("Piece")
+    ]
+    results = _run(_read_piece, arguments, _get_workers(workers), task)
+    if results is None:
+        return None
+    dimensions = whole_extent[1::2] - whole_extent[::2] + 1
+    extent, origin, spacing, _, colors, color_name, _ = results[0]
+    origin = origin - (extent[::2] - whole_extent[::2]) * spacing
+    mesh = get_uniform_grid(dimensions=dimensions, origin=origin,
+                            spacing=spacing, array_name=color_name)
+    mesh_colors = np.zeros(
+        (int(np.prod(dimensions - 1)),) + colors.shape[3:],
+        dtype=colors.dtype)
+    # the default colors are replaced by the colors of the pieces
+    add_mesh_cell_array(mesh, color_name, mesh_colors)
+    mesh_colors = _as_slices(mesh_colors, dimensions)
+    mesh_ghosts = _as_slices(vtk_to_numpy(get_mesh_ghost_array(mesh)),
+                             dimensions)
+    for extent, _, _, ghosts, colors, _, field_arrays in results:
+        start = extent[::2] - whole_extent[::2]
+        stop = start + np.asarray(ghosts.shape[2::-1])
+        region = tuple(slice(start[axis], stop[axis])
+                       for axis in range(3))[::-1]
+        mesh_ghosts[region] = ghosts
+        mesh_colors[region] = colors
+    for name, array in results[0][-1]:
+        _add_field_array(mesh, name, array)
+    return mesh
+
+
+def _write_piece(filename, extent, origin, spacing, ghosts, colors,
+                 color_name, field_arrays):
+    dimensions = np.asarray(ghosts.shape[2::-1]) + 1
+    mesh = get_structured_grid(
+        dimensions=dimensions,
+        origin=origin + np.asarray(extent[::2]) * spacing,
+        spacing=spacing,
+        array_name=color_name,
+    )
+    mesh.SetExtent(*extent)
+    shape = (-1,) + colors.shape[3:]
+    add_mesh_cell_array(mesh, color_name, colors.reshape(shape))
+    vtk_to_numpy(get_mesh_ghost_array(mesh))[:] = ghosts.ravel()
+    for name, array in field_arrays:
+        _add_field_array(mesh, name, array)
+    writer = vtk.vtkXMLStructuredGridWriter()
+    writer.SetFileName(filename)
+    writer.SetInputData(mesh)
+    writer.Write()
+
+
+def _read_piece(filename):
+    reader = vtk.vtkXMLStructuredGridReader()
+    reader.SetFileName(filename)
+    reader.Update()
+    mesh = reader.GetOutput()
+    extent = np.asarray(mesh.GetExtent())
+    dimensions = extent[1::2] - extent[::2] + 1
+    bounds = np.asarray(mesh.GetBounds())
+    origin = bounds[::2]
+    spacing = (bounds[1::2] - bounds[::2]) / np.maximum(dimensions - 1, 1)
+    color_array = mesh.GetCellData().GetScalars()
+    colors = _as_slices(vtk_to_numpy(color_array), dimensions)
+    ghosts = _as_slices(vtk_to_numpy(get_mesh_ghost_array(mesh)), dimensions)
+    return (extent, origin, spacing, ghosts, colors, color_array.GetName(),
+            _get_field_arrays(mesh))
+
+
+def _run(function, arguments, workers, task):
+    # return the results in order or None if the task is cancelled
+    results = [None] * len(arguments)
+    # the processes are spawned to not inherit the threads of the UI
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(arguments)),
+                             mp_context=context) as executor:
+        futures = {executor.submit(function, *args): index
+                   for index, args in enumerate(arguments)}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=.1,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future]] = future.result()
+            if task is None:
+                continue
+            task.set_progress(1. - len(pending) / len(arguments))
+            if task.cancelled:
+                for future in pending:
+                    future.cancel()
+                return None
+    return results
+
+
+def _write_index(filename, dimensions, color_name, data_arrays, pieces):
+    root = ElementTree.Element("VTKFile", type="PStructuredGrid",
+                               version="0.1", byte_order="LittleEndian")
+    grid = ElementTree.SubElement(
+        root, "PStructuredGrid", GhostLevel="0",
+        WholeExtent=_format_extent(
+            [0, dimensions[0] - 1, 0, dimensions[1] - 1,
+             0, dimensions[2] - 1]))
+    cell_data = ElementTree.SubElement(grid, "PCellData", Scalars=color_name)
+    for name, dtype, components in data_arrays:
+        ElementTree.SubElement(
+            cell_data, "PDataArray", type=_get_xml_type(dtype), Name=name,
+            NumberOfComponents=str(components))
+    points = ElementTree.SubElement(grid, "PPoints")
+    ElementTree.SubElement(points, "PDataArray", type="Float64",
+                           Name="Points", NumberOfComponents="3")
+    for extent, source in pieces:
+        ElementTree.SubElement(grid, "Piece", Extent=_format_extent(extent),
+                               Source=source)
+    ElementTree.ElementTree(root).write(str(filename), xml_declaration=True)
+
+
+def _is_piece_directory(directory):
+    # the directory holds the pieces of a previous export only
+    if not directory.is_dir():
+        return False
+    prefix = directory.name + "_"
+    for filename in directory.iterdir():
+        index = filename.stem[len(prefix):]
+        if not filename.name.startswith(prefix) or \
+           filename.suffix != ".vts" or not index.isdigit():
+            return False
+    return True
+
+
+def _get_workers(workers):
+    if workers > 0:
+        return workers
+    return os.cpu_count() or 1
+
+
+def _get_slabs(number_of_slices, number_of_pieces):
+    # the point slices on the borders are shared by two slabs
+    bounds = np.linspace(0, number_of_slices,
+                         min(number_of_pieces, number_of_slices) + 1)
+    bounds = np.round(bounds).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _as_slices(array, dimensions):
+    # the (z, y, x) view of the cell array
+    shape = tuple(np.asarray(dimensions)[::-1] - 1) + array.shape[1:]
+    return array.reshape(shape)
+
+
+def _get_field_arrays(mesh):
+    field_data = mesh.GetFieldData()
+    return [(field_data.GetArrayName(index),
+             vtk_to_numpy(field_data.GetArray(index)).copy())
+            for index in range(field_data.GetNumberOfArrays())]
+
+
+def _add_field_array(mesh, name, array):
+    vtk_array = numpy_to_vtk(array, deep=True)
+    vtk_array.SetName(name)
+    mesh.GetFieldData().AddArray(vtk_array)
+
+
+def _get_xml_type(dtype):
+    kind = {"f": "Float", "u": "UInt", "i": "Int"}[np.dtype(dtype).kind]
+    return "{}{}".format(kind, np.dtype(dtype).itemsize * 8)
+
+
+def _format_extent(extent):
+    return " ".join(str(int(value)) for value in extent)
@@ -0,0 +1,107 @@
+"""Module about the picking of the scene."""
+
+import numpy as np
+import vtk
+
+
+class GridPicker(object):
+    """Pick the grid plane by intersecting it with the camera ray.
+
+    The picker follows the API of vtkPicker used by Intersection but
+    only the grid is picked, in constant time.
+    """
+
+    def __init__(self, grid=None):
+        """Initialize the GridPicker."""
+        self.grid = grid
+        self.observers = list()
+        self.cell_id = -1
+        self.selection_point = np.zeros(3)
+        self.pick_position = np.zeros(3)
+        self.picked_positions = vtk.vtkPoints()
+        self.actors = vtk.vtkActorCollection()
+
+    def AddObserver(self, event, callback):
+        """Call ``callback`` when ``event`` is invoked."""
+        self.observers.append((event, callback))
+
+    def InvokeEvent(self, event):
+        """Call the observers of the event."""
+        for observed_event, callback in self.observers:
+            if observed_event == event:
+                callback(self, vtk.vtkCommand.GetStringFromEventId(event))
+
+    def Pick(self, x, y, z, renderer):
+        """Pick the grid at the given display position."""
+        self.selection_point = np.array([x, y, z], dtype=np.float64)
+        self.cell_id = -1
+        self.picked_positions.Reset()
+        self.actors.RemoveAllItems()
+        if self.grid is not None and self.grid.actor is not None:
+            ray_origin, ray_direction = get_ray(renderer, x, y)
+            position = intersect_plane(ray_origin, ray_direction,
+                                       self.grid.origin[2])
+            if position is not None:
+                self.cell_id = _get_cell_id(self.grid, position)
+            if self.cell_id != -1:
+                self.pick_position = position
+                self.picked_positions.InsertNextPoint(position)
+                self.actors.AddItem(self.grid.actor)
+        self.InvokeEvent(vtk.vtkCommand.EndPickEvent)
+        return int(self.cell_id != -1)
+
+    def GetCellId(self):
+        """Return the id of the picked cell of the grid or -1."""
+        return self.cell_id
+
+    def GetSelectionPoint(self):
+        """Return the display position of the pick."""
+        return tuple(self.selection_point)
+
+    def GetPickPosition(self):
+        """Return the picked position."""
+        return tuple(self.pick_position)
+
+    def GetPickedPositions(self):
+        """Return the picked positions."""
+        return self.picked_positions
+
+    def GetActors(self):
+        """Return the picked actors."""
+        return self.actors
+
+
+def get_ray(renderer, x, y):
+    """Return the origin and the direction of the camera ray at x, y.
+
+    The ray goes from the near plane to the far plane of the camera.
+    """
+    points = list()
+    for depth in (0., 1.):
+        renderer.SetDisplayPoint(x, y, depth)
+        renderer.DisplayToWorld()
+        point = np.asarray(renderer.GetWorldPoint())
+        points.append(point[:3] / point[3])
+    return points[0], points[1] - points[0]
+
+
+def intersect_plane(ray_origin, ray_direction, z):
+    """Intersect the ray with the horizontal plane at z, or return None."""
+    if np.isclose(ray_direction[2], 0.):
+        return None
+    distance = (z - ray_origin[2]) / ray_direction[2]
+    if distance < 0:
+        return None
+    position = ray_origin + distance * ray_direction
+    position[2] = z
+    return position
+
+
+def _get_cell_id(grid, position):
+    cell_dimensions = grid.dimensions[:2] - 1
+    coords = (position[:2] - grid.origin[:2]) / grid.spacing[:2]
+    if np.any(coords < 0) or np.any(coords > cell_dimensions):
+        return -1
+    # the far border belongs to the last cell
+    coords = np.minimum(np.floor(coords), cell_dimensions - 1).astype(int)
+    return int(coords[0] + coords[1] * cell_dimensions[0])
@@ -167,6 +167,25 @@ class SymmetrySelector(AreaSelector):
             new_coords[0] = self.dimensions[0] - coords[0] - 2
             self.selector_xy.select(new_coords)
 
+    def symmetric_coords(self, coords):
+        """Return the (..., 3) coords with their symmetric copies."""
+        coords = np.asarray(coords)
+        copies = [coords]
+        if self.symmetry in (Symmetry.SYMMETRY_X, Symmetry.SYMMETRY_XY):
+            new_coords = coords.copy()
+            new_coords[..., 1] = self.dimensions[1] - coords[..., 1] - 2
+            copies.append(new_coords)
+        if self.symmetry in (Symmetry.SYMMETRY_Y, Symmetry.SYMMETRY_XY):
+            new_coords = coords.copy()
+            new_coords[..., 0] = self.dimensions[0] - coords[..., 0] - 2
+            copies.append(new_coords)
+        if self.symmetry is Symmetry.SYMMETRY_XY:
+            new_coords = coords.copy()
+            new_coords[..., 1] = self.dimensions[1] - coords[..., 1] - 2
+            new_coords[..., 0] = self.dimensions[0] - coords[..., 0] - 2
+            copies.append(new_coords)
+        return copies
+
     def show(self):
         """Show the selector."""
         super().show()
@@ -0,0 +1,123 @@
+"""Module about the versions of the blocks in a content-addressed store."""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+import numpy as np
+
+from .chunk import HIDDEN_CELL
+
+SHAPE = struct.Struct("<3I")
+
+
+class VersionStore(object):
+    """Versions of the blocks sharing their identical chunks.
+
+    Each unique chunk of cells is stored once under the hash of its
+    content and a version is a manifest of the hashes of its chunks.
+    """
+
+    def __init__(self, path):
+        """Initialize the VersionStore."""
+        self.path = Path(path)
+        self.object_path = self.path.joinpath("objects")
+        self.manifest_path = self.path.joinpath("manifests")
+        self.object_path.mkdir(parents=True, exist_ok=True)
+        self.manifest_path.mkdir(parents=True, exist_ok=True)
+
+    def save(self, block):
+        """Store a version of the blocks and return its id.
+
+        Only the chunks that are not in the store yet are written.
+        """
+        chunks = list()
+        for start, ghosts, colors in block.get_chunk_windows():
+            visible = (ghosts & HIDDEN_CELL) == 0
+            if not np.any(visible):
+                continue
+            payload = b"".join((
+                SHAPE.pack(*ghosts.shape),
+                np.packbits(visible).tobytes(),
+                np.ascontiguousarray(colors[visible]).tobytes(),
+            ))
+            key = hashlib.sha256(payload).hexdigest()
+            filename = self._get_object_file(key)
+            if not filename.exists():
+                filename.parent.mkdir(exist_ok=True)
+                # an object is only stored once complete
+                temporary_filename = filename.with_suffix(".tmp")
+                temporary_filename.write_bytes(zlib.compress(payload))
+                os.replace(str(temporary_filename), str(filename))
+            chunks.append(start.tolist() + [key])
+        manifest = {
+            "time": time.time(),
+            "dimensions": block.dimensions.tolist(),
+            "color_type": block.color_type,
+            "color_dtype": np.dtype(block.color_dtype).str,
+            "color_shape": list(np.shape(block.cell_color)),
+            "palette": [] if block.palette is None else
+            block.palette.tolist(),
+            "chunks": chunks,
+        }
+        data = json.dumps(manifest).encode("utf-8")
+        version = hashlib.sha256(data).hexdigest()
+        self.manifest_path.joinpath(version + ".json").write_bytes(data)
+        return version
+
+    def get_versions(self):
+        """Return the ids of the versions from the oldest to the newest."""
+        versions = [(self.load(filename.stem)["time"], filename.stem)
+                    for filename in self.manifest_path.glob("*.json")]
+        return [version for _, version in sorted(versions)]
+
+    def load(self, version):
+        """Return the manifest of a version."""
+        filename = self.manifest_path.joinpath(version + ".json")
+        if not filename.exists():
+            raise ValueError("There is no version {}".format(version))
+        return json.loads(filename.read_text())
+
+    def checkout(self, version, block):
+        """Replace the blocks by a version, the history is cleared."""
+        manifest = self.load(version)
+        if not np.array_equal(manifest["dimensions"], block.dimensions) or \
+           manifest["color_type"] != block.color_type:
+            raise ValueError("The version {} does not match the "
+                             "blocks".format(version))
+        color_dtype = np.dtype(manifest["color_dtype"])
+        color_shape = tuple(manifest["color_shape"])
+        nx, ny = block.dimensions[0] - 1, block.dimensions[1] - 1
+        ids = list()
+        colors = list()
+        for x, y, z, key in manifest["chunks"]:
+            payload = zlib.decompress(self._get_object_file(key).read_bytes())
+            shape = SHAPE.unpack_from(payload)
+            size = int(np.prod(shape))
+            visible = np.unpackbits(
+                np.frombuffer(payload, dtype=np.uint8, offset=SHAPE.size,
+                              count=(size + 7) // 8),
+                count=size).astype(bool).reshape(shape)
+            chunk_colors = np.frombuffer(
+                payload, dtype=color_dtype,
+                offset=SHAPE.size + (size + 7) // 8)
+            local_z, local_y, local_x = np.nonzero(visible)
+            ids.append(local_x + x + (local_y + y + (local_z + z) * ny) * nx)
+            colors.append(chunk_colors.reshape((-1,) + color_shape))
+        # the chunks are assembled in a single update
+        with block.transaction():
+            block.remove_all()
+            if manifest["palette"]:
+                block.set_palette(manifest["palette"])
+            if ids:
+                ids = np.concatenate(ids)
+                block.set_cells(ids, np.ones(len(ids), dtype=bool),
+                                np.concatenate(colors))
+        if block.history is not None:
+            block.history.clear()
+
+    def _get_object_file(self, key):
+        return self.object_path.joinpath(key[:2], key[2:])
@@ -0,0 +1,139 @@
+"""Module about the block surface extraction."""
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, numpy_to_vtkIdTypeArray
+
+# corners of a face in the (b, c) plane of its axis, scaled by the size of
+# the face, the faces are counterclockwise when seen from outside the cell
+QUAD_CORNERS = {
+    -1: np.array([(0, 0), (0, 1), (1, 1), (1, 0)]),
+    1: np.array([(0, 0), (1, 0), (1, 1), (0, 1)]),
+}
+
+
+def extract_surface(filled, colors, greedy=False):
+    """Extract the faces between the filled and the empty cells.
+
+    ``filled`` is a (z, y, x) grid of booleans padded by one cell on each
+    side and ``colors`` is the (z, y, x) grid of the inner cells. With
+    ``greedy``, the adjacent coplanar faces of the same color are merged
+    into rectangles. Return the corners of the quads and their texture
+    coordinates in cell units and the color of each quad.
+    """
+    inner = filled[1:-1, 1:-1, 1:-1]
+    if greedy:
+        # the faces are merged by identical colors
+        grid_shape = inner.shape
+        values = colors.reshape(int(np.prod(grid_shape)), -1)
+        _, keys = np.unique(values, axis=0, return_inverse=True)
+        keys = keys.reshape(grid_shape)
+    points = list()
+    tcoords = list()
+    face_colors = list()
+    for axis in range(3):
+        # axis of the (z, y, x) grid
+        grid_axis = 2 - axis
+        for side in (-1, 1):
+            neighbors = [slice(1, -1)] * 3
+            neighbors[grid_axis] = slice(1 + side, filled.shape[grid_axis]
+                                         - 1 + side)
+            faces = inner & ~filled[tuple(neighbors)]
+            if greedy:
+                cells, sizes = _merge_faces(faces, keys, axis)
+            else:
+                cells = np.stack(np.nonzero(faces)[::-1], axis=-1)
+                sizes = np.ones((len(cells), 2), dtype=np.int64)
+            quads, quad_tcoords = _get_quads(cells, sizes, axis, side)
+            points.append(quads.reshape(-1, 3))
+            tcoords.append(quad_tcoords.reshape(-1, 2))
+            face_colors.append(colors[tuple(cells[:, ::-1].T)])
+    return (np.concatenate(points), np.concatenate(tcoords),
+            np.concatenate(face_colors))
+
+
+def _merge_faces(faces, keys, axis):
+    # merge the faces into rectangles in the (b, c) plane of the axis,
+    # first into runs along b then the runs stacked along c
+    b_axis, c_axis = (axis + 1) % 3, (axis + 2) % 3
+    order = (2 - axis, 2 - c_axis, 2 - b_axis)
+    faces = faces.transpose(order)
+    keys = keys.transpose(order)
+    same = np.zeros_like(faces)
+    same[..., 1:] = faces[..., 1:] & faces[..., :-1] & \
+        (keys[..., 1:] == keys[..., :-1])
+    next_same = np.zeros_like(faces)
+    next_same[..., :-1] = same[..., 1:]
+    a, c, b = np.nonzero(faces & ~same)
+    _, _, b_end = np.nonzero(faces & ~next_same)
+    width = b_end - b + 1
+    key = keys[a, c, b]
+
+    sorter = np.lexsort((c, key, width, b, a))
+    a, c, b, width, key = (array[sorter] for array in (a, c, b, width, key))
+    stacked = np.zeros(len(a), dtype=bool)
+    stacked[1:] = (a[1:] == a[:-1]) & (b[1:] == b[:-1]) & \
+        (width[1:] == width[:-1]) & (key[1:] == key[:-1]) & \
+        (c[1:] == c[:-1] + 1)
+    first = np.flatnonzero(~stacked)
+    height = np.diff(np.append(first, len(a)))
+
+    cells = np.empty((len(first), 3), dtype=np.int64)
+    cells[:, axis] = a[first]
+    cells[:, b_axis] = b[first]
+    cells[:, c_axis] = c[first]
+    sizes = np.stack((width[first], height), axis=-1)
+    return cells, sizes
+
+
+def _get_quads(cells, sizes, axis, side):
+    # corners of the faces starting at the cells with the given sizes
+    b_axis, c_axis = (axis + 1) % 3, (axis + 2) % 3
+    tcoords = QUAD_CORNERS[side][np.newaxis] * sizes[:, np.newaxis, :]
+    quads = np.repeat(cells[:, np.newaxis, :], 4, axis=1)
+    quads[:, :, axis] += side > 0
+    quads[:, :, b_axis] += tcoords[:, :, 0]
+    quads[:, :, c_axis] += tcoords[:, :, 1]
+    return quads, tcoords
+
+
+def set_quads(mesh, points, array_name, colors, tcoords=None):
+    """Replace the content of the polydata with independent quads."""
+    number_of_faces = len(colors)
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_to_vtk(points.astype(np.float64), deep=True))
+    offsets = np.arange(0, 4 * number_of_faces + 1, 4, dtype=np.int64)
+    connectivity = np.arange(4 * number_of_faces, dtype=np.int64)
+    polys = vtk.vtkCellArray()
+    polys.SetData(numpy_to_vtkIdTypeArray(offsets, deep=True),
+                  numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    vtk_colors = numpy_to_vtk(colors, deep=True)
+    vtk_colors.SetName(array_name)
+    mesh.SetPoints(vtk_points)
+    mesh.SetPolys(polys)
+    cell_data = mesh.GetCellData()
+    cell_data.AddArray(vtk_colors)
+    cell_data.SetActiveScalars(array_name)
+    if tcoords is not None:
+        vtk_tcoords = numpy_to_vtk(tcoords.astype(np.float32), deep=True)
+        mesh.GetPointData().SetTCoords(vtk_tcoords)
+    mesh.Modified()
+
+
+def get_edge_texture(edge_color, size=16):
+    """Create a texture drawing the edges of a cell, repeated per cell."""
+    image = np.full((size, size, 3), 255, dtype=np.uint8)
+    edge_color = np.clip(np.round(np.asarray(edge_color) * 255.), 0, 255)
+    for border in (0, -1):
+        image[border] = edge_color
+        image[:, border] = edge_color
+    image_data = vtk.vtkImageData()
+    image_data.SetDimensions(size, size, 1)
+    image_data.GetPointData().SetScalars(
+        numpy_to_vtk(image.reshape(-1, 3), deep=True))
+    texture = vtk.vtkTexture()
+    texture.SetInputData(image_data)
+    texture.RepeatOn()
+    texture.InterpolateOn()
+    texture.MipmapOn()
+    return texture
@@ -0,0 +1,51 @@
+"""Module about the tasks running on a worker thread."""
+
+import vtk
+
+
+class Task(object):
+    """Function running on a worker thread with progress and cancellation.
+
+    The function receives the Task as first argument, it reports its
+    progress with ``observe`` or ``set_progress`` and checks
+    ``cancelled`` between its steps.
+    """
+
+    def __init__(self, executor, function, *args):
+        """Initialize the Task and submit it to the executor."""
+        self.progress = 0.
+        self.cancelled = False
+        self.algorithms = list()
+        self.future = executor.submit(function, self, *args)
+
+    def observe(self, algorithm, start=0., stop=1.):
+        """Report the progress of a VTK algorithm within [start, stop]."""
+        def _update(caller, unused):
+            del unused
+            self.set_progress(start + caller.GetProgress() * (stop - start))
+
+        algorithm.AddObserver(vtk.vtkCommand.ProgressEvent, _update)
+        self.algorithms.append(algorithm)
+        if self.cancelled:
+            algorithm.AbortExecuteOn()
+
+    def set_progress(self, value):
+        """Set the progress between 0 and 1."""
+        self.progress = min(max(value, 0.), 1.)
+
+    def cancel(self):
+        """Request the cancellation of the Task."""
+        self.cancelled = True
+        for algorithm in self.algorithms:
+            algorithm.AbortExecuteOn()
+
+    def done(self):
+        """Return True if the function returned."""
+        return self.future.done()
+
+    def result(self):
+        """Return the result of the function or None if cancelled."""
+        result = self.future.result()
+        if self.cancelled:
+            return None
+        return result
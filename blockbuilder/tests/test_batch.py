@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from blockbuilder.app import batch
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+from blockbuilder.blockset import read_blockset
+from blockbuilder.partition import read_partitioned
+
+
+def test_batch(tmpdir, monkeypatch):
+    output_dir = tmpdir.mkdir("tmpdir")
+    monkeypatch.setenv("BB_TESTING", str(output_dir.join("config.json")))
+    first_filename = str(output_dir.join("first.vts"))
+    second_filename = str(output_dir.join("second.bb"))
+    for storage in ("implicit", "sparse"):
+        block = batch.main([
+            "--dimensions", "5", "5", "3", "--storage", storage,
+            "--fill", "0", "0", "0", "3", "3", "0",
+            "--remove", "0", "0", "0",
+            "--export", first_filename,
+        ])
+        assert len(block.get_visible_cells()[0]) == 15
+
+        # the grid grows to contain the merged blocks
+        script_filename = output_dir.join("script.txt")
+        script_filename.write("# recolor the merged blocks\n"
+                              "recolor 1 0 0\n"
+                              "\n"
+                              "export {}\n".format(second_filename))
+        block = batch.main([
+            "--dimensions", "3", "3", "3", "--storage", storage,
+            "--fill", "0", "0", "1",
+            "--merge", first_filename,
+            "--script", str(script_filename),
+        ])
+        assert np.array_equal(block.dimensions, [5, 5, 3])
+        blockset = read_blockset(second_filename)
+        ids, colors = blockset.get_visible_cells()
+        assert len(ids) == 16
+        assert np.all(colors == [255, 0, 0])
+
+    # the recolor of a palette only changes the current material
+    block = batch.main([
+        "--dimensions", "4", "4", "4", "--color-type", "palette",
+        "--color", "1", "0", "0", "--fill", "0", "0", "0",
+        "--color", "0", "1", "0", "--fill", "1", "0", "0",
+        "--recolor", "0", "0", "1", "--export", second_filename,
+    ])
+    blockset = read_blockset(second_filename)
+    ids, materials = blockset.get_visible_cells()
+    assert np.array_equal(ids, [0, 1])
+    assert np.array_equal(blockset.palette[materials],
+                          [[1, 0, 0], [0, 0, 1]])
+
+    with pytest.raises(SystemExit):
+        batch.main(["--fill", "0", "0"])
+    # only the operations are allowed in a script
+    script_filename.write("dimensions 6 6 6\n")
+    with pytest.raises(SystemExit):
+        batch.main(["--script", str(script_filename)])
+    with pytest.raises(SystemExit):
+        batch.main(["--merge", str(output_dir.join("missing.bb"))])
+
+
+def test_batch_without_qt(tmpdir):
+    code = ("import sys\n"
+            "from blockbuilder.app import batch\n"
+            "batch.main(['--fill', '0', '0', '0', '--export', "
+            "sys.argv[1]])\n"
+            "assert not any(module.startswith(('qtpy', 'PyQt')) "
+            "for module in sys.modules)\n")
+    subprocess.run([sys.executable, "-c", code, str(tmpdir.join("out.vti"))],
+                   env=dict(os.environ,
+                            BB_TESTING=str(tmpdir.join("config.json"))),
+                   check=True)
+
+
+def test_batch_script(tmpdir):
+    # the workers of the partitioned files re-run the script
+    root_path = Path(__file__).parents[2]
+    script = root_path.joinpath("scripts", "blockbuilder-batch")
+    filename = str(tmpdir.join("out.pvts"))
+    subprocess.run([sys.executable, str(script), "--dimensions", "6", "6",
+                    "6", "--fill", "0", "0", "0", "3", "3", "3",
+                    "--export", filename],
+                   env=dict(os.environ, PYTHONPATH=str(root_path),
+                            BB_TESTING=str(tmpdir.join("config.json"))),
+                   check=True, timeout=120)
+    mesh = read_partitioned(filename, workers=1)
+    block = Block(rcParams, mesh.GetDimensions(), mesh)
+    assert len(block.get_visible_cells()[0]) == 64
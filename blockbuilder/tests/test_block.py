@@ -1,9 +1,12 @@
+import copy
 import numpy as np
+import pytest
 import vtk
+from vtk.util.numpy_support import vtk_to_numpy
 from blockbuilder.params import rcParams
 from blockbuilder.utils import _hasattr, get_structured_grid
 from blockbuilder.element import ElementId
-from blockbuilder.block import Block
+from blockbuilder.block import Block, _convert_colors
 
 
 def test_block():
@@ -20,6 +23,7 @@ def test_block():
     assert _hasattr(block, "color", np.ndarray)
     assert _hasattr(block, "edge_color", np.ndarray)
     assert _hasattr(block, "merge_policy", str)
+    assert _hasattr(block, "storage", str)
     assert _hasattr(block, "spacing", np.ndarray)
     assert _hasattr(block, "dimensions", np.ndarray)
     assert _hasattr(block, "number_of_cells", int)
@@ -46,6 +50,27 @@ def test_block():
             block.merge(external_block)
     assert all(block.dimensions == dimensions)
 
+    # the overlapping cells follow the merge policy
+    external_block.remove_all()
+    external_block.set_color((1., 0., 0.))
+    external_block.add(coords=[0, 0, 0])
+    for policy, expected_color in (("internal", (0., 0., 1.)),
+                                   ("external", (1., 0., 0.))):
+        block.remove_all()
+        block.set_color((0., 0., 1.))
+        block.add(coords=[0, 0, 0])
+        block.merge_policy = policy
+        block.merge(external_block)
+        assert np.allclose(block.colors[0],
+                           _convert_colors(expected_color, block.color_type))
+    block.remove_all()
+    block.merge(external_block)
+    assert block.mesh.IsCellVisible(0)
+    assert not block.mesh.IsCellVisible(1)
+    assert np.allclose(block.colors[0],
+                       _convert_colors((1., 0., 0.), block.color_type))
+    block.set_color(rcParams["block"]["color"])
+
     block.remove_all()
     assert not block.mesh.IsCellVisible(0)
     block.add(coords=[0, 0, 0])
@@ -57,12 +82,333 @@ def test_block():
     block.add(coords=([0, 0, 0], [0, 0, 1]))
     block.add(coords=([0, 0, 0], [0, 0, 1]))
     assert block.mesh.IsCellVisible(0)
+    assert block.mesh.IsCellVisible(4)
+    assert not block.mesh.IsCellVisible(1)
     block.remove(coords=([0, 0, 0], [0, 0, 1]))
     block.remove(coords=([0, 0, 0], [0, 0, 1]))
     assert not block.mesh.IsCellVisible(0)
+    assert not block.mesh.IsCellVisible(4)
+    block.add(coords=([0, 0, 0], [1, 1, 1]))
+    assert all(block.mesh.IsCellVisible(cell_id) for cell_id in range(8))
+    assert np.allclose(block.colors, block.cell_color)
+    block.remove(coords=([1, 0, 0], [1, 1, 1]))
+    assert [block.mesh.IsCellVisible(cell_id) for cell_id in range(8)] == \
+        [True, False] * 4
 
     block.set_color(color=(255, 255, 255), is_int=True)
     assert np.allclose(block.color, (1., 1., 1.))
 
     # require an actor (i.e. a plotter)
     # block.toggle_edges(False)
+
+
+def test_block_storage():
+    params = copy.deepcopy(rcParams)
+    dimensions = [3, 4, 5]
+    for storage, mesh_type in (("implicit", vtk.vtkUniformGrid),
+                               ("explicit", vtk.vtkStructuredGrid)):
+        params["block"]["storage"]["value"] = storage
+        block = Block(params=params, dimensions=dimensions)
+        assert isinstance(block.mesh, mesh_type)
+        block.add(coords=[1, 2, 3])
+        for mesh in (block.as_structured_grid(), block.as_uniform_grid()):
+            assert mesh.GetNumberOfCells() == block.number_of_cells
+            assert mesh.IsCellVisible(block.number_of_cells - 1)
+            assert not mesh.IsCellVisible(0)
+            assert tuple(mesh.GetDimensions()) == tuple(dimensions)
+
+
+def test_block_color_type():
+    params = copy.deepcopy(rcParams)
+    blocks = dict()
+    for color_type, dtype in (("uint8", np.uint8), ("float", np.float64)):
+        params["block"]["color_type"]["value"] = color_type
+        block = Block(params=params, dimensions=[3, 3, 3])
+        assert block.color_type == color_type
+        assert block.colors.dtype == dtype
+        block.set_color((255, 0, 0), is_int=True)
+        block.add(coords=[0, 0, 0])
+        blocks[color_type] = block
+    # colors are converted when the types differ
+    for block in blocks.values():
+        for other_block in blocks.values():
+            if other_block is block:
+                continue
+            block.remove_all()
+            block.merge(other_block)
+            assert block.mesh.IsCellVisible(0)
+            assert np.allclose(_convert_colors(block.colors[0], "float"),
+                               (1., 0., 0.))
+    assert np.array_equal(_convert_colors((0., .5, 1.), "uint8"),
+                          (0, 128, 255))
+
+
+def test_block_palette():
+    params = copy.deepcopy(rcParams)
+    params["block"]["color_type"]["value"] = "palette"
+    dimensions = [3, 3, 3]
+    block = Block(params=params, dimensions=dimensions)
+    assert block.color_type == "palette"
+    assert block.colors.dtype == np.uint16
+    assert isinstance(block.lookup_table, vtk.vtkLookupTable)
+    assert not block.plotting["rgba"]
+    red, green = (1., 0., 0.), (0., 1., 0.)
+    block.set_color(red)
+    block.add(coords=([0, 0, 0], [1, 1, 1]))
+    red_material = block.cell_color
+    block.set_color(green)
+    block.add(coords=[0, 0, 0])
+    green_material = block.cell_color
+    assert red_material != green_material
+    assert np.allclose(block.palette[block.colors[[0, 1]]], (green, red))
+    # existing materials are reused
+    block.set_color(red)
+    assert block.cell_color == red_material
+    number_of_materials = len(block.palette)
+    # recolor all the blocks of one material
+    block.set_palette_color(red_material, (0, 0, 255), is_int=True)
+    assert np.allclose(block.palette[block.colors[1]], (0., 0., 1.))
+    assert len(block.palette) == number_of_materials
+    assert block.lookup_table.GetNumberOfTableValues() == number_of_materials
+
+    # the palette is exported with the blocks
+    imported_block = Block(params=rcParams, dimensions=None,
+                           mesh=block.as_structured_grid())
+    assert imported_block.color_type == "palette"
+    assert np.allclose(imported_block.palette[:number_of_materials],
+                       block.palette)
+
+    # merge with and without palette
+    direct_block = Block(params=rcParams, dimensions=dimensions)
+    direct_block.merge(block)
+    assert direct_block.mesh.IsCellVisible(0)
+    assert np.allclose(_convert_colors(direct_block.colors[0], "float"),
+                       green)
+    other_block = Block(params=params, dimensions=dimensions)
+    other_block.merge(block)
+    other_block.merge(direct_block)
+    assert np.allclose(other_block.palette[other_block.colors[[0, 1]]],
+                       (green, (0., 0., 1.)))
+
+    with pytest.raises(ValueError, match="palette"):
+        direct_block.set_palette_color(0, red)
+
+
+def test_block_sparse():
+    params = copy.deepcopy(rcParams)
+    params["block"]["storage"]["value"] = "sparse"
+    # only the occupied chunks are allocated
+    block = Block(params=params, dimensions=[1025, 1025, 1025])
+    assert block.mesh is None
+    assert len(block.chunks) == 0
+    block.add(coords=[1000, 10, 500])
+    assert len(block.chunks) == 1
+    block.add(coords=([0, 0, 0], [16, 0, 0]))
+    assert len(block.chunks) == 3
+    block.remove(coords=([0, 0, 0], [16, 0, 0]))
+    assert list(block.chunks.keys()) == [(62, 0, 31)]
+    block.remove_all()
+    assert len(block.chunks) == 0
+
+    # same behaviour as the dense storage
+    dimensions = [20, 4, 3]
+    dense_params = copy.deepcopy(rcParams)
+    dense_params["block"]["color_type"]["value"] = "float"
+    dense_block = Block(params=dense_params, dimensions=dimensions)
+    for color_type in ("uint8", "palette"):
+        params["block"]["color_type"]["value"] = color_type
+        block = Block(params=params, dimensions=dimensions)
+        block.set_color((1., 0., 0.))
+        block.add(coords=([0, 0, 0], [17, 2, 1]))
+        block.set_color((0., 1., 0.))
+        block.add(coords=[18, 2, 1])
+        block.remove(coords=([0, 0, 0], [17, 1, 1]))
+        mesh = block.as_uniform_grid()
+        visible = [mesh.IsCellVisible(cell_id)
+                   for cell_id in range(block.number_of_cells)]
+        assert sum(visible) == 18 * 2 + 1
+        for other_block in (block.as_structured_grid(), mesh):
+            other_block = Block(params=rcParams, dimensions=None,
+                                mesh=other_block)
+            assert other_block.color_type == color_type
+        dense_block.remove_all()
+        dense_block.merge(block)
+        assert [dense_block.mesh.IsCellVisible(cell_id) for cell_id in
+                range(block.number_of_cells)] == visible
+        assert np.allclose(dense_block.colors[[112, 113]],
+                           ((1., 0., 0.), (0., 1., 0.)))
+        block.remove_all()
+        block.merge(dense_block)
+        assert len(block.chunks) == 2
+        mesh = block.as_uniform_grid()
+        assert [mesh.IsCellVisible(cell_id) for cell_id in
+                range(block.number_of_cells)] == visible
+    block.add_all()
+    assert len(block.chunks) == 2
+    assert all(chunk.visible for chunk in block.chunks.values())
+
+
+def test_block_transaction():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 2
+    block = Block(params=params, dimensions=[5, 5, 5])
+    block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+    chunk = block.chunks[(0, 0, 0)]
+    mtime = block.mesh.GetMTime()
+    with block.transaction():
+        block.add(coords=[0, 0, 0])
+        with block.transaction():
+            block.add(coords=[1, 1, 1])
+        block.remove(coords=[0, 0, 0])
+        # nothing is updated before the end of the transaction
+        assert block.mesh.GetMTime() == mtime
+        assert not chunk.visible
+        assert (0, 0, 0) in block.dirty_chunks
+    assert block.mesh.GetMTime() > mtime
+    assert chunk.visible
+    assert chunk.number_of_faces == 6
+    assert len(block.dirty_chunks) == 0
+    with pytest.raises(RuntimeError, match="transaction"):
+        block.commit()
+
+
+def test_block_raycast():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 4
+    rng = np.random.RandomState(0)
+    for storage in ("implicit", "sparse"):
+        params["block"]["storage"]["value"] = storage
+        block = Block(params=params, dimensions=[7, 8, 9])
+        assert block.raycast([3, 3, 20], [0, 0, -1]) is None
+        block.add(coords=[2, 3, 4])
+        assert block.is_visible([2, 3, 4])
+        assert not block.is_visible([2, 3, 5])
+        assert not block.is_visible([-1, 3, 4])
+        for origin, direction, normal in (
+                ([2.5, 3.5, 20], [0, 0, -1], [0, 0, 1]),
+                ([-5, 3.5, 4.5], [2, 0, 0], [-1, 0, 0]),
+                ([2.5, 20, 4.5], [0, -1, 0], [0, 1, 0])):
+            coords, hit_normal, distance = block.raycast(origin, direction)
+            assert np.array_equal(coords, [2, 3, 4])
+            assert np.array_equal(hit_normal, normal)
+            hit = np.asarray(origin) + distance * np.asarray(direction)
+            assert np.isclose(np.dot(hit - [2.5, 3.5, 4.5], normal), .5)
+        # the ray starts inside the block
+        assert block.raycast([2.5, 3.5, 4.5], [0, 0, -1]) is None
+        # the ray starts on the face of the block
+        coords, hit_normal, _ = block.raycast([2.5, 3.5, 5], [0, 0, -1])
+        assert np.array_equal(hit_normal, [0, 0, 1])
+        # the first block along the ray, compared with a dense sampling
+        block.add(coords=([0, 0, 0], [5, 6, 0]))
+        for _ in range(50):
+            cells = rng.randint(0, 6, size=(5, 3))
+            for cell in cells:
+                block.add(coords=cell)
+            origin = rng.uniform(-10, 20, size=3)
+            target = rng.uniform(0, 6, size=3)
+            direction = target - origin
+            result = block.raycast(origin, direction)
+            samples = origin + np.linspace(0, 3, 30000)[:, np.newaxis] * \
+                direction
+            samples = np.floor(samples).astype(int)
+            inside = np.all((samples >= 0) & (samples < [6, 7, 8]), axis=1)
+            samples = samples[inside]
+            mesh = block.as_uniform_grid()
+            visible = np.array([mesh.IsCellVisible(cell_id) for cell_id in
+                                range(block.number_of_cells)], dtype=bool)
+            visible = visible[samples[:, 0] + samples[:, 1] * 6 +
+                              samples[:, 2] * 6 * 7]
+            expected = samples[np.argmax(visible)] if any(visible) else None
+            if expected is None or visible[0] and \
+               np.array_equal(samples[0], np.floor(origin)):
+                assert result is None
+            else:
+                assert np.array_equal(result[0], expected)
+                assert np.abs(result[1]).sum() in (0, 1)
+            for cell in cells:
+                block.remove(coords=cell)
+
+
+def test_block_cells():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 3
+    rng = np.random.RandomState(0)
+    cells = rng.randint(-1, 8, size=(40, 3))
+    for storage in ("implicit", "sparse"):
+        params["block"]["storage"]["value"] = storage
+        block = Block(params=params, dimensions=[7, 8, 9])
+        block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+        expected = Block(params=params, dimensions=[7, 8, 9])
+        expected.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+        # same as the single block operations, out of bounds are ignored
+        block.add_cells(cells)
+        for cell in cells:
+            expected.add(coords=cell)
+        for operation in ("add", "remove"):
+            for index, chunk in expected.chunks.items():
+                assert block.chunks[index].number_of_faces == \
+                    chunk.number_of_faces
+            assert len(block.dirty_chunks) == 0
+            block.remove_cells(cells[::2])
+            for cell in cells[::2]:
+                expected.remove(coords=cell)
+        for cell in np.ndindex(6, 7, 8):
+            assert block.is_visible(cell) == expected.is_visible(cell)
+
+
+def test_block_history():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 3
+    for storage in ("implicit", "sparse"):
+        params["block"]["storage"]["value"] = storage
+        block = Block(params=params, dimensions=[7, 8, 9])
+        block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+        assert not block.undo()
+        block.add(coords=([0, 0, 0], [5, 6, 0]))
+        block.set_color([1., 0., 0.])
+        block.begin_gesture()
+        block.add_cells([[1, 1, 1], [2, 2, 2]])
+        block.remove(coords=[0, 0, 0])
+        block.add(coords=[3, 3, 0])
+        block.end_gesture()
+        state = block.as_uniform_grid()
+        block.remove_all()
+        assert not block.is_visible([1, 1, 1])
+        # a full reset is reverted at once
+        assert block.undo()
+        assert _same_blocks(block.as_uniform_grid(), state)
+        assert block.undo()
+        assert block.is_visible([0, 0, 0])
+        assert not block.is_visible([1, 1, 1])
+        for index, chunk in block.chunks.items():
+            expected = Block(params=params, dimensions=[7, 8, 9])
+            expected.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+            expected.add(coords=([0, 0, 0], [5, 6, 0]))
+            assert expected.chunks[index].number_of_faces == \
+                chunk.number_of_faces
+        assert block.undo()
+        assert len(block.chunks) == 0 or storage != "sparse"
+        assert not block.undo()
+        for _ in range(3):
+            assert block.redo()
+        assert not block.redo()
+        assert not block.is_visible([1, 1, 1])
+        assert block.undo()
+        assert _same_blocks(block.as_uniform_grid(), state)
+
+    params["block"]["history_budget"] = 0
+    block = Block(params=params, dimensions=[7, 8, 9])
+    assert block.history is None
+    block.add(coords=[0, 0, 0])
+    assert not block.undo()
+    assert not block.redo()
+
+
+def _same_blocks(mesh, other):
+    # same visible cells with the same colors
+    visible = vtk_to_numpy(mesh.GetCellGhostArray()) == 0
+    other_visible = vtk_to_numpy(other.GetCellGhostArray()) == 0
+    colors = vtk_to_numpy(mesh.GetCellData().GetArray("color"))
+    other_colors = vtk_to_numpy(other.GetCellData().GetArray("color"))
+    return np.array_equal(visible, other_visible) and \
+        np.array_equal(colors[visible], other_colors[visible])
@@ -0,0 +1,59 @@
+import copy
+import numpy as np
+import pytest
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+from blockbuilder.journal import copy_state
+from blockbuilder.blockset import Blockset, write_blockset, read_blockset
+
+
+def test_blockset(tmpdir):
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 4
+    filename = str(tmpdir.join("blockset.bb"))
+    for storage in ("implicit", "sparse"):
+        for color_type in ("uint8", "float", "palette"):
+            params["block"]["storage"]["value"] = storage
+            params["block"]["color_type"]["value"] = color_type
+            block = Block(params=params, dimensions=[9, 8, 7])
+            block.add(coords=([0, 0, 0], [5, 3, 2]))
+            block.set_color([1., 0., 0.])
+            block.add(coords=[7, 6, 5])
+            block.remove(coords=[1, 1, 1])
+            ids, colors = block.get_visible_cells()
+            order = np.argsort(ids)
+            for compression in (False, True):
+                write_blockset(filename, copy_state(block), compression)
+                blockset = read_blockset(filename)
+                assert isinstance(blockset, Blockset)
+                assert isinstance(blockset.occupancy, np.memmap) != \
+                    compression
+                assert np.array_equal(blockset.dimensions, [9, 8, 7])
+                assert blockset.color_type == color_type
+                assert (blockset.palette is None) == \
+                    (color_type != "palette")
+                blockset_ids, blockset_colors = blockset.get_visible_cells()
+                assert np.array_equal(blockset_ids, ids[order])
+                assert np.array_equal(blockset_colors, colors[order])
+
+                # the cells are read when the blockset is merged
+                merged = Block(params=params, dimensions=[9, 8, 7])
+                merged.merge(blockset)
+                merged_ids, merged_colors = merged.get_visible_cells()
+                merged_order = np.argsort(merged_ids)
+                assert np.array_equal(merged_ids[merged_order], ids[order])
+                assert np.array_equal(
+                    _get_rgb(merged, merged_colors[merged_order]),
+                    _get_rgb(block, colors[order]))
+                del blockset
+
+    with open(filename, "wb") as fp:
+        fp.write(b"\x00" * 64)
+    with pytest.raises(ValueError, match="blockset"):
+        read_blockset(filename)
+
+
+def _get_rgb(block, colors):
+    if block.palette is None:
+        return colors
+    return block.palette[colors]
@@ -0,0 +1,64 @@
+import copy
+import os
+import numpy as np
+import pytest
+import vtk
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+
+
+def test_chunk_cache(tmpdir):
+    params = copy.deepcopy(rcParams)
+    params["block"]["storage"]["value"] = "sparse"
+    params["block"]["chunk_size"] = 4
+    params["block"]["color_type"]["value"] = "palette"
+    dimensions = [17, 17, 9]
+    block = Block(params=params, dimensions=dimensions)
+    path = str(tmpdir.join("chunks"))
+    params["block"]["paging"] = {"budget": 0.002, "path": path}
+    paged_block = Block(params=params, dimensions=dimensions)
+    paged_block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+    for edited_block in (block, paged_block):
+        edited_block.add(coords=([0, 0, 0], [15, 15, 3]))
+        edited_block.set_color([1., 0., 0.])
+        edited_block.add(coords=([2, 2, 5], [10, 10, 7]))
+        edited_block.remove(coords=([3, 3, 0], [12, 12, 1]))
+        edited_block.undo()
+        edited_block.redo()
+    # only a part of the chunks fits in the budget
+    cache = paged_block.cache
+    assert 1 < len(cache.loaded) < len(paged_block.chunks)
+    assert cache.nbytes <= cache.budget
+    assert len(os.listdir(path)) > 1
+    assert all(chunk.visible for chunk in paged_block.chunks.values())
+    ids, colors = block.get_visible_cells()
+    order = np.argsort(ids)
+    paged_ids, paged_colors = paged_block.get_visible_cells()
+    paged_order = np.argsort(paged_ids)
+    assert np.array_equal(paged_ids[paged_order], ids[order])
+    assert np.array_equal(paged_colors[paged_order], colors[order])
+    assert paged_block.is_visible([8, 8, 7])
+    assert paged_block.raycast([8.5, 8.5, 50.], [0., 0., -1.])[0].tolist() \
+        == [8, 8, 7]
+
+    # the chunks are stored for the next session
+    paged_block.flush()
+    stored_block = Block(params=params, dimensions=dimensions)
+    assert len(stored_block.chunks) == len(paged_block.chunks)
+    assert len(stored_block.cache.loaded) == 0
+    stored_ids, stored_colors = stored_block.get_visible_cells()
+    stored_order = np.argsort(stored_ids)
+    assert np.array_equal(stored_ids[stored_order], ids[order])
+    assert np.array_equal(stored_colors[stored_order], colors[order])
+    assert np.array_equal(stored_block.palette, paged_block.palette)
+    stored_block.remove_all()
+    assert len(os.listdir(path)) == 1
+    with pytest.raises(ValueError, match="match"):
+        Block(params=params, dimensions=[9, 9, 9])
+
+    # the chunks are paged to a temporary directory by default
+    params["block"]["paging"]["path"] = ""
+    paged_block = Block(params=params, dimensions=dimensions)
+    paged_block.add_all()
+    assert paged_block.cache.temporary
+    assert len(os.listdir(str(paged_block.cache.path))) > 1
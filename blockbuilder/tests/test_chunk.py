@@ -0,0 +1,109 @@
+import copy
+import numpy as np
+import vtk
+from blockbuilder.params import rcParams
+from vtk.util.numpy_support import vtk_to_numpy
+from blockbuilder.utils import _hasattr, get_mesh_cell_array
+from blockbuilder.block import Block
+from blockbuilder.chunk import Chunk
+
+
+def _create_actor(mesh, **kwargs):
+    mapper = vtk.vtkDataSetMapper()
+    mapper.SetInputData(mesh)
+    actor = vtk.vtkActor()
+    actor.SetMapper(mapper)
+    return actor
+
+
+def test_chunk():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 2
+    block = Block(params=params, dimensions=[6, 4, 3])
+    chunk = Chunk(block, (2, 1, 0))
+    assert _hasattr(chunk, "actor", type(None))
+    assert _hasattr(chunk, "index", tuple)
+    assert _hasattr(chunk, "start", np.ndarray)
+    assert _hasattr(chunk, "stop", np.ndarray)
+    assert _hasattr(chunk, "dimensions", np.ndarray)
+    assert _hasattr(chunk, "mesh", type(None))
+    assert _hasattr(chunk, "surface", vtk.vtkPolyData)
+    assert _hasattr(chunk, "visible", bool)
+    # the last chunks are clipped to the blocks
+    assert all(chunk.dimensions == [2, 2, 3])
+    assert np.allclose(chunk.origin, [4, 2, 0])
+
+    actor = block.load_actor(_create_actor)
+    assert isinstance(actor, vtk.vtkAssembly)
+    assert len(block.chunks) == 3 * 2 * 1
+    assert not any(chunk.visible for chunk in block.chunks.values())
+
+    # only the modified chunks are updated
+    mtimes = {index: chunk.surface.GetMTime()
+              for index, chunk in block.chunks.items()}
+    block.add(coords=[4, 2, 1])
+    for index, chunk in block.chunks.items():
+        modified = chunk.surface.GetMTime() > mtimes[index]
+        assert modified == (index in ((1, 1, 0), (2, 0, 0), (2, 1, 0)))
+        assert chunk.visible == (index == (2, 1, 0))
+        assert chunk.actor.GetVisibility() == chunk.visible
+    chunk = block.chunks[(2, 1, 0)]
+    assert chunk.number_of_faces == 6
+    assert np.allclose(chunk.surface.GetBounds(), [4, 5, 2, 3, 1, 2])
+    colors = get_mesh_cell_array(chunk.surface, block.color_array_name)
+    assert np.allclose(vtk_to_numpy(colors), block.cell_color)
+
+    # the neighbor chunks are updated too
+    mtimes = {index: chunk.surface.GetMTime()
+              for index, chunk in block.chunks.items()}
+    block.add(coords=[3, 2, 1])
+    for index, chunk in block.chunks.items():
+        modified = chunk.surface.GetMTime() > mtimes[index]
+        assert modified == (index in ((1, 0, 0), (1, 1, 0), (2, 1, 0)))
+    assert block.chunks[(2, 1, 0)].number_of_faces == 5
+
+    block.add(coords=([0, 0, 0], [4, 2, 1]))
+    assert all(chunk.visible for chunk in block.chunks.values())
+    block.remove_all()
+    assert not any(chunk.visible for chunk in block.chunks.values())
+    block.toggle_edges(False)
+
+
+def test_chunk_sparse():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 2
+    params["block"]["storage"]["value"] = "sparse"
+    block = Block(params=params, dimensions=[6, 4, 3])
+    block.add(coords=[0, 0, 0])
+    actor = block.load_actor(_create_actor)
+    assert actor.GetParts().GetNumberOfItems() == 1
+    # the actors follow the allocated chunks
+    block.add(coords=[4, 2, 1])
+    assert actor.GetParts().GetNumberOfItems() == 2
+    assert isinstance(block.chunks[(2, 1, 0)].mesh, vtk.vtkUniformGrid)
+    assert block.chunks[(2, 1, 0)].actor.GetVisibility()
+    block.remove(coords=[0, 0, 0])
+    assert actor.GetParts().GetNumberOfItems() == 1
+    assert list(block.chunks.keys()) == [(2, 1, 0)]
+    block.remove_all()
+    assert actor.GetParts().GetNumberOfItems() == 0
+    block.toggle_edges(False)
+
+
+def test_chunk_greedy_meshing():
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 4
+    params["block"]["greedy_meshing"] = True
+    block = Block(params=params, dimensions=[5, 5, 5])
+    block.load_actor(_create_actor)
+    block.add(coords=([0, 0, 0], [3, 3, 3]))
+    chunk = block.chunks[(0, 0, 0)]
+    assert chunk.number_of_faces == 6
+    assert chunk.surface.GetPointData().GetTCoords() is not None
+    # the edges of the cells are drawn with a texture
+    assert not chunk.actor.GetProperty().GetEdgeVisibility()
+    assert chunk.actor.GetTexture() is block.edge_texture
+    block.toggle_edges(False)
+    assert chunk.actor.GetTexture() is None
+    block.toggle_edges(True)
+    assert chunk.actor.GetTexture() is block.edge_texture
@@ -1,3 +1,4 @@
+import copy
 from blockbuilder.params import rcParams
 from blockbuilder.utils import _hasattr, get_poly_data, get_uniform_grid
 from blockbuilder.core_plotter import CorePlotter
@@ -46,3 +47,32 @@ def test_core_plotter(qtbot):
     qtbot.addWidget(plotter)
     plotter.show()
     plotter.close()
+
+
+def test_core_plotter_render_scene(qtbot):
+    params = copy.deepcopy(rcParams)
+    params["plotter"]["max_fps"] = 1
+    plotter = CorePlotter(params=params, testing=True)
+    assert _hasattr(plotter, "max_fps", int)
+    qtbot.addWidget(plotter)
+    plotter.show()
+    # the requests are coalesced
+    plotter.render_scene()
+    plotter.render_scene()
+    assert plotter.render_timer.isActive()
+    qtbot.waitUntil(lambda: plotter.last_render_time is not None)
+    last_render_time = plotter.last_render_time
+    # the next render waits for the next frame
+    plotter.render_scene()
+    assert plotter.render_timer.interval() > 0
+    plotter.flush_render()
+    assert not plotter.render_timer.isActive()
+    assert plotter.last_render_time > last_render_time
+    # no limit
+    plotter.max_fps = 0
+    last_render_time = plotter.last_render_time
+    plotter.render_scene()
+    assert not plotter.render_timer.isActive()
+    assert plotter.last_render_time > last_render_time
+    plotter.render_scene()
+    plotter.close()
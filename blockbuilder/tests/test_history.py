@@ -0,0 +1,75 @@
+import numpy as np
+
+from blockbuilder.history import Delta, History
+
+
+def test_delta():
+    ids = np.array([3, 1, 200])
+    old_visible = np.array([True, False, True])
+    new_visible = np.array([False, True, True])
+    old_colors = np.array([[1, 2, 3], [4, 5, 6]], dtype=np.uint8)
+    new_colors = np.array([[7, 8, 9], [0, 0, 0]], dtype=np.uint8)
+    delta = Delta(ids, old_visible, new_visible, old_colors, new_colors)
+    assert delta.ids.dtype == np.uint8
+    for new, visible, colors in ((False, old_visible, old_colors),
+                                 (True, new_visible, new_colors)):
+        delta_ids, delta_visible, delta_colors = delta.get(new)
+        assert np.array_equal(delta_ids, ids)
+        assert np.array_equal(delta_visible, visible)
+        assert np.array_equal(delta_colors, colors)
+
+
+def test_history():
+    visible = np.zeros(10, dtype=bool)
+    colors = np.zeros(10)
+
+    def _read_cells(ids):
+        return visible[ids], colors[ids]
+
+    def _edit(ids, color):
+        history.track(ids, *_read_cells(ids))
+        visible[ids] = True
+        colors[ids] = color
+
+    history = History(budget=1000)
+    assert history.commit(_read_cells) is None
+    assert len(history.undo_stack) == 0
+    # the first state of a cell is kept within an entry
+    history.begin()
+    _edit(np.array([1, 2]), 1.)
+    _edit(np.array([2, 3]), 2.)
+    history.end()
+    history.commit(_read_cells)
+    assert len(history.undo_stack) == 1
+    ids, old_visible, old_colors = history.undo().get(new=False)
+    assert np.array_equal(ids, [1, 2, 3])
+    assert not np.any(old_visible)
+    assert len(old_colors) == 0
+    ids, new_visible, new_colors = history.redo().get(new=True)
+    assert np.all(new_visible)
+    assert np.array_equal(new_colors, [1., 2., 2.])
+    assert history.redo() is None
+    # the unchanged cells are not recorded
+    _edit(np.array([1]), 1.)
+    history.commit(_read_cells)
+    assert len(history.undo_stack) == 1
+    # a new entry clears the redo stack
+    history.undo()
+    _edit(np.array([5]), 3.)
+    history.commit(_read_cells)
+    assert len(history.redo_stack) == 0
+    # the oldest entries are evicted
+    history.budget = history.undo_stack[-1].nbytes
+    _edit(np.array([6]), 4.)
+    history.commit(_read_cells)
+    assert len(history.undo_stack) == 1
+    assert history.nbytes <= history.budget
+    # an entry larger than the budget can still be undone
+    history.budget = 1
+    _edit(np.arange(7, 10), 5.)
+    delta = history.commit(_read_cells)
+    assert history.undo_stack == [delta]
+    assert history.undo() is delta
+    history.clear()
+    assert history.undo() is None
+    assert history.nbytes == 0
@@ -0,0 +1,126 @@
+import copy
+import numpy as np
+import vtk
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+from blockbuilder.journal import (Session, Journal, read_journal,
+                                  write_snapshot, read_snapshot, replay,
+                                  copy_state, CELLS_RECORD, PALETTE_RECORD)
+
+
+def test_journal(tmpdir):
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 3
+    filename = str(tmpdir.join("journal.bin"))
+    snapshot_filename = str(tmpdir.join("snapshot.npz"))
+    for storage in ("implicit", "sparse"):
+        for color_type in ("uint8", "palette"):
+            params["block"]["storage"]["value"] = storage
+            params["block"]["color_type"]["value"] = color_type
+            block = Block(params=params, dimensions=[7, 8, 9])
+            block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+            block.add(coords=([0, 0, 0], [5, 6, 0]))
+            write_snapshot(snapshot_filename, copy_state(block),
+                           generation=7)
+            journal = Journal(filename, block, generation=7,
+                              flush_interval=0.)
+            block.journal = journal
+            block.set_color([1., 0., 0.])
+            block.add_cells([[1, 1, 1], [2, 2, 2]])
+            block.remove(coords=[0, 0, 0])
+            block.undo()
+            block.remove(coords=[3, 3, 0])
+            journal.flush()
+            ids, colors = block.get_visible_cells()
+            journal.close()
+
+            generation, dimensions, records = read_journal(filename)
+            assert generation == 7
+            assert np.array_equal(dimensions, [7, 8, 9])
+            kinds = [kind for kind, _ in records]
+            assert kinds.count(CELLS_RECORD) == 4
+            assert kinds.count(PALETTE_RECORD) == \
+                int(color_type == "palette")
+            snapshot = read_snapshot(snapshot_filename)
+            assert snapshot["generation"] == 7
+            assert snapshot["color_type"] == color_type
+            recovered = Block(params=params, dimensions=[7, 8, 9])
+            replay(recovered, snapshot, records)
+            recovered_ids, recovered_colors = recovered.get_visible_cells()
+            assert np.array_equal(np.sort(recovered_ids), np.sort(ids))
+            assert np.array_equal(recovered_colors[np.argsort(recovered_ids)],
+                                  colors[np.argsort(ids)])
+
+            # a torn record at the end is ignored
+            with open(filename, "ab") as fp:
+                fp.write(b"\x00\x10\x00")
+            _, _, torn_records = read_journal(filename)
+            assert len(torn_records) == len(records)
+
+
+def test_session(tmpdir):
+    params = copy.deepcopy(rcParams)
+    path = tmpdir.join("session")
+    session = Session(str(path), flush_interval=0.)
+    assert not session.exists()
+    block = Block(params=params, dimensions=[7, 8, 9])
+    block.load_actor(lambda mesh, **kwargs: vtk.vtkActor())
+    session.start(block)
+    assert session.exists()
+    # nothing changed since the snapshot
+    assert not session.autosave()
+    block.add(coords=([0, 0, 0], [2, 2, 0]))
+    assert session.autosave()
+    session.wait()
+    assert not session.autosave()
+    assert len(path.listdir()) == 2
+    block.remove(coords=[1, 1, 0])
+    session.journal.flush()
+    ids, _ = block.get_visible_cells()
+    # the edits of a crashed session are recovered
+    session.stop()
+    assert block.journal is None
+    session = Session(str(path), flush_interval=0.)
+    assert session.exists()
+    snapshot, records = session.recover()
+    recovered = Block(params=params, dimensions=[7, 8, 9])
+    replay(recovered, snapshot, records)
+    recovered_ids, _ = recovered.get_visible_cells()
+    assert np.array_equal(np.sort(recovered_ids), np.sort(ids))
+    session.close()
+    assert not session.exists()
+    assert len(path.listdir()) == 0
+
+    # the edits are journaled without the undo history
+    params["block"]["history_budget"] = 0
+    block = Block(params=params, dimensions=[7, 8, 9])
+    assert block.history is None
+    session = Session(str(path), flush_interval=0.)
+    session.start(block)
+    block.add(coords=([0, 0, 0], [2, 2, 0]))
+    block.remove_cells([[1, 1, 0]])
+    session.journal.flush()
+    ids, _ = block.get_visible_cells()
+    session.stop()
+    snapshot, records = session.recover()
+    assert len(records) == 2
+    recovered = Block(params=params, dimensions=[7, 8, 9])
+    replay(recovered, snapshot, records)
+    recovered_ids, _ = recovered.get_visible_cells()
+    assert np.array_equal(np.sort(recovered_ids), np.sort(ids))
+    session.close()
+
+
+def test_session_lock(tmpdir):
+    path = str(tmpdir.join("session"))
+    session = Session(path)
+    other_session = Session(path)
+    assert session.acquire()
+    assert session.acquire()
+    # the session of a running instance is not recovered by another one
+    assert not other_session.acquire()
+    session.stop()
+    assert other_session.acquire()
+    other_session.close()
+    assert session.acquire()
+    session.release()
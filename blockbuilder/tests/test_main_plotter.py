@@ -1,3 +1,4 @@
+import copy
 import os
 import numpy as np
 import pytest
@@ -13,10 +14,12 @@ from blockbuilder.plane import Plane
 from blockbuilder.selector import Symmetry, SymmetrySelector
 from blockbuilder.setting import SettingDialog
 from blockbuilder.help import HelpDialog
+from blockbuilder.picker import get_ray
 from blockbuilder.main_plotter import (MainPlotter, BlockMode, Action, Toggle,
-                                       _get_toolbar_area)
+                                       _get_line, _get_toolbar_area)
 
 rcParams["dimensions"] = [8, 8, 8]
+rcParams["session"]["journal"] = False
 event_delay = 300
 
 
@@ -32,6 +35,7 @@ def test_main_plotter(qtbot):
     _hasattr(plotter, "button_pressed", bool)
     _hasattr(plotter, "button_released", bool)
     _hasattr(plotter, "area_selection", bool)
+    _hasattr(plotter, "pick_state", type(None))
     _hasattr(plotter, "floor", type(None))
     _hasattr(plotter, "ceiling", type(None))
     _hasattr(plotter, "icons", type(None))
@@ -88,7 +92,8 @@ def test_main_plotter(qtbot):
 def test_main_plotter_actions(qtbot, tmpdir):
     output_dir = str(tmpdir.mkdir("tmpdir"))
     assert os.path.isdir(output_dir)
-    filename = str(os.path.join(output_dir, "tmp.vtk"))
+    filenames = [str(os.path.join(output_dir, "tmp" + extension))
+                 for extension in (".vtk", ".vti", ".bb", ".pvts")]
 
     offset = np.asarray([2, 2, 2])
     old_dims = rcParams["dimensions"]
@@ -105,7 +110,8 @@ def test_main_plotter_actions(qtbot, tmpdir):
         # export blockset
         plotter = MainPlotter(params=rcParams, testing=True)
         qtbot.addWidget(plotter)
-        plotter.action_export(filename)
+        for filename in filenames:
+            plotter.action_export(filename)
         with pytest.raises(TypeError, match="filename"):
             plotter.action_export(-1)
         with pytest.raises(ValueError, match="empty"):
@@ -117,7 +123,8 @@ def test_main_plotter_actions(qtbot, tmpdir):
         # import blockset
         plotter = MainPlotter(params=rcParams, testing=True)
         qtbot.addWidget(plotter)
-        plotter.action_import(filename)
+        for filename in filenames:
+            plotter.action_import(filename)
         with pytest.raises(TypeError, match="type"):
             plotter.action_import(-1)
         with pytest.raises(ValueError, match="empty"):
@@ -150,6 +157,262 @@ def test_main_plotter_block_scenario(qtbot):
     plotter.close()
 
 
+def test_main_plotter_pick_cache(qtbot, monkeypatch):
+    plotter = MainPlotter(params=rcParams, testing=True)
+    qtbot.addWidget(plotter)
+    plotter.render_scene()
+    plotter.flush_render()
+    selected = list()
+    select = plotter.selector.select
+    monkeypatch.setattr(plotter.selector, "select",
+                        lambda coords: selected.append(select(coords)))
+    window_size = plotter.window_size
+    x, y = window_size[0] // 2, window_size[1] // 2
+
+    # the same hovered cell is selected only once
+    for _ in range(3):
+        plotter.picker.Pick(x, y, 0, plotter.renderer)
+    assert len(selected) == 1
+    assert plotter.pick_state is not None
+    # a change of the selector state invalidates the cache
+    plotter.set_symmetry(Symmetry.SYMMETRY_X)
+    plotter.picker.Pick(x, y, 0, plotter.renderer)
+    assert len(selected) == 2
+    # the button press is never skipped
+    plotter.button_pressed = True
+    plotter.picker.Pick(x, y, 0, plotter.renderer)
+    plotter.button_pressed = False
+    assert len(selected) == 3
+    assert plotter.block.is_visible(plotter.coords)
+    # the cache is used again after a click
+    event_picker = _EventPicker(x, y)
+    plotter.on_mouse_left_press(event_picker, None)
+    plotter.on_mouse_left_release(event_picker, None)
+    assert not plotter.button_released
+    number_of_selections = len(selected)
+    for _ in range(3):
+        plotter.picker.Pick(x, y, 0, plotter.renderer)
+    assert len(selected) == number_of_selections + 1
+    plotter.close()
+
+
+class _EventPicker(object):
+    def __init__(self, x, y):
+        self.position = (x, y)
+
+    def GetEventPosition(self):
+        return self.position
+
+
+def test_main_plotter_stroke(qtbot, monkeypatch):
+    plotter = MainPlotter(params=rcParams, testing=True)
+    qtbot.addWidget(plotter)
+    plotter.render_scene()
+    plotter.flush_render()
+    painted = list()
+    add_cells = plotter.block.add_cells
+    monkeypatch.setattr(plotter.block, "add_cells",
+                        lambda cells: painted.append(add_cells(cells)))
+
+    def _pick(coords):
+        world = (np.asarray(coords) + .5) * plotter.unit
+        world[2] = 0.
+        plotter.renderer.SetWorldPoint(*world, 1.)
+        plotter.renderer.WorldToDisplay()
+        x, y, _ = plotter.renderer.GetDisplayPoint()
+        plotter.picker.Pick(x, y, 0, plotter.renderer)
+
+    # a fast drag fills the cells between the picks, once per segment
+    plotter.button_pressed = True
+    for coords in ([0, 0, 0], [5, 2, 0], [0, 0, 0]):
+        _pick(coords)
+    plotter.button_pressed = False
+    plotter.stroke_coords = None
+    plotter.stroke_cells = set()
+    assert len(painted) == 2
+    for cell in _get_line([0, 0, 0], [5, 2, 0]):
+        assert plotter.block.is_visible(cell)
+    assert not plotter.block.is_visible([0, 1, 1])
+
+    # the stroke is picked on the plane of the grid
+    world = np.array([3.9, 1.9, 0.]) * plotter.unit
+    plotter.renderer.SetWorldPoint(*world, 1.)
+    plotter.renderer.WorldToDisplay()
+    x, y, _ = plotter.renderer.GetDisplayPoint()
+    ray_origin, ray_direction = get_ray(plotter.renderer, x, y)
+    plotter.stroke_coords = np.array([0, 0, 0])
+    coords = plotter._pick_stroke_coords(ray_origin, ray_direction)
+    plotter.stroke_coords = None
+    assert np.array_equal(coords, [3, 1, 0])
+    plotter.close()
+
+
+def test_main_plotter_undo(qtbot):
+    plotter = MainPlotter(params=rcParams, testing=True)
+    qtbot.addWidget(plotter)
+    plotter.block.begin_gesture()
+    plotter.block.add(coords=[0, 0, 0])
+    plotter.block.add(coords=[1, 0, 0])
+    plotter.block.end_gesture()
+    plotter.action_reset(None)
+    plotter.undo()
+    assert plotter.block.is_visible([1, 0, 0])
+    plotter.undo()
+    assert not plotter.block.is_visible([0, 0, 0])
+    plotter.redo()
+    assert plotter.block.is_visible([0, 0, 0])
+    plotter.close()
+
+
+def test_main_plotter_session(qtbot, tmpdir, monkeypatch):
+    monkeypatch.setenv("BB_TESTING", str(tmpdir.join("config.json")))
+    params = copy.deepcopy(rcParams)
+    params["session"]["journal"] = True
+    params["session"]["flush_interval"] = 0.
+    plotter = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(plotter)
+    assert plotter.session.exists()
+    plotter.block.add(coords=([0, 0, 0], [2, 2, 0]))
+    plotter.autosave()
+    plotter.session.wait()
+    plotter.block.remove(coords=[1, 1, 0])
+    plotter.session.journal.flush()
+    # the session of a running instance is left alone
+    with pytest.warns(UserWarning, match="another instance"):
+        other = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(other)
+    assert other.session is None
+    assert not other.block.is_visible([2, 2, 0])
+    other.close()
+    # the journal of a crashed session is recovered
+    plotter.session.stop()
+    recovered = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(recovered)
+    assert recovered.block.is_visible([2, 2, 0])
+    assert not recovered.block.is_visible([1, 1, 0])
+    assert not recovered.block.undo()
+    recovered.session.stop()
+    recovered.session = None
+    recovered.close()
+
+    # the colors are converted to the current type
+    params["block"]["color_type"]["value"] = "palette"
+    converted = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(converted)
+    assert converted.block.color_type == "palette"
+    assert converted.block.is_visible([2, 2, 0])
+    assert not converted.block.is_visible([1, 1, 0])
+    converted.close()
+    assert not converted.session.exists()
+    plotter.session = None
+    plotter.close()
+
+
+def test_main_plotter_task(qtbot, tmpdir):
+    plotter = MainPlotter(params=rcParams, testing=True)
+    qtbot.addWidget(plotter)
+    plotter.block.add(coords=([0, 0, 0], [2, 2, 0]))
+    filename = str(tmpdir.join("task.vti"))
+    # the export runs on the worker thread
+    plotter.action_export(True)
+    plotter.export_dialog.fileSelected.emit(filename)
+    assert plotter.task is not None
+    with pytest.raises(RuntimeError, match="running"):
+        plotter.start_task("", lambda task: None)
+    qtbot.waitUntil(lambda: plotter.task is None)
+    assert os.path.exists(filename)
+
+    # the import is merged on the main thread
+    plotter.block.remove_all()
+    plotter.action_import(True)
+    plotter.import_dialog.fileSelected.emit(filename)
+    plotter.wait_task()
+    assert plotter.task is None
+    assert plotter.block.is_visible([2, 2, 0])
+
+    # a cancelled task has no effect
+    plotter.block.remove_all()
+    plotter.action_import(True)
+    plotter.import_dialog.fileSelected.emit(filename)
+    plotter.progress_dialog.canceled.emit()
+    plotter.wait_task()
+    assert not plotter.block.is_visible([2, 2, 0])
+
+    # the errors of the worker are reported
+    filename = tmpdir.join("invalid.bb")
+    filename.write("0" * 64)
+    plotter.import_dialog.fileSelected.emit(str(filename))
+    plotter.wait_task()
+    assert plotter.task is None
+    assert "not a blockset" in plotter.error_dialog.text()
+    plotter.close()
+
+
+def test_main_plotter_paging(qtbot, tmpdir):
+    params = copy.deepcopy(rcParams)
+    params["block"]["storage"]["value"] = "sparse"
+    params["block"]["paging"]["budget"] = 1
+    params["block"]["paging"]["path"] = str(tmpdir.join("chunks"))
+    plotter = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(plotter)
+    block = plotter.block
+    block.add(coords=[1, 1, 0])
+    # the blocks paged to a directory are not resized
+    imported_block = Block(params=rcParams, dimensions=[12, 8, 8])
+    imported_block.add(coords=[10, 1, 0])
+    with pytest.raises(ValueError, match="cannot be resized"):
+        plotter._merge_blockset(imported_block)
+    assert plotter.block is block
+    assert np.array_equal(plotter.dimensions, rcParams["dimensions"])
+    assert block.is_visible([1, 1, 0])
+    plotter.close()
+
+
+def test_main_plotter_version(qtbot, tmpdir, monkeypatch):
+    monkeypatch.setenv("BB_TESTING", str(tmpdir.join("config.json")))
+    params = copy.deepcopy(rcParams)
+    params["session"]["journal"] = True
+    params["session"]["flush_interval"] = 0.
+    plotter = MainPlotter(params=params, testing=True)
+    qtbot.addWidget(plotter)
+    assert plotter.version_store is None
+    plotter.show_versions()
+    assert "no stored version" in plotter.error_dialog.text()
+    plotter.block.add(coords=[5, 5, 5])
+    version = plotter.save_version()
+    assert plotter.version_store.get_versions() == [version]
+    # the versions are checked out from their list
+    plotter.block.remove_all()
+    plotter.block.add(coords=[1, 1, 1])
+    plotter.show_versions()
+    labels = list(plotter.versions)
+    assert len(labels) == 1
+    plotter.version_dialog.textValueSelected.emit(labels[0])
+    assert plotter.block.is_visible([5, 5, 5])
+    assert not plotter.block.is_visible([1, 1, 1])
+    # the checkout is recovered after a crash, with or without a resize
+    for dimensions in (None, [12, 8, 8]):
+        if dimensions is not None:
+            imported_block = Block(params=params, dimensions=dimensions)
+            imported_block.add(coords=[10, 1, 1])
+            plotter._merge_blockset(imported_block)
+            plotter.checkout_version(version)
+            assert np.array_equal(plotter.dimensions, [8, 8, 8])
+        plotter.session.wait()
+        plotter.session.journal.flush()
+        plotter.session.stop()
+        recovered = MainPlotter(params=params, testing=True)
+        qtbot.addWidget(recovered)
+        assert recovered.block.is_visible([5, 5, 5])
+        assert not recovered.block.is_visible([1, 1, 1])
+        recovered.session.stop()
+        recovered.session = None
+        recovered.close()
+        plotter.session.acquire()
+        plotter.session.start(plotter.block)
+    plotter.close()
+
+
 def test_main_plotter_move_camera(qtbot):
     plotter = MainPlotter(params=rcParams, testing=True)
     qtbot.addWidget(plotter)
@@ -184,13 +447,13 @@ def test_main_plotter_action_export_dialog(qtbot):
     plotter.close()
 
 
-def test_main_plotter_action_setting(qtbot, tmpdir):
+def test_main_plotter_action_setting(qtbot, tmpdir, monkeypatch):
     # use a temporary configuration file to avoid
     # modifying the default one.
     output_dir = str(tmpdir.mkdir("tmpdir"))
     assert os.path.isdir(output_dir)
     filename = str(os.path.join(output_dir, "tmp.json"))
-    os.environ["BB_TESTING"] = filename
+    monkeypatch.setenv("BB_TESTING", filename)
 
     plotter = MainPlotter(params=rcParams, testing=True)
     qtbot.addWidget(plotter)
@@ -268,3 +531,13 @@ def _play_area_scenario(qtbot, plotter):
         qtbot.mouseMove(plotter.render_widget, end_point, event_delay)
         qtbot.mouseRelease(plotter.render_widget, QtCore.Qt.LeftButton,
                            QtCore.Qt.NoModifier, end_point, event_delay)
+
+
+def test_get_line():
+    line = _get_line([0, 0, 2], [5, -2, 2])
+    assert np.array_equal(line[0], [0, 0, 2])
+    assert np.array_equal(line[-1], [5, -2, 2])
+    # consecutive cells are neighbors
+    assert len(line) == 6
+    assert np.all(np.abs(np.diff(line, axis=0)).max(axis=1) == 1)
+    assert np.array_equal(_get_line([1, 2, 3], [1, 2, 3]), [[1, 2, 3]])
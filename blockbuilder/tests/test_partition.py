@@ -0,0 +1,66 @@
+import copy
+import os
+import numpy as np
+import pytest
+import vtk
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+from blockbuilder.partition import write_partitioned, read_partitioned
+
+
+def test_partition(tmpdir):
+    params = copy.deepcopy(rcParams)
+    filename = str(tmpdir.join("partition.pvts"))
+    for color_type in ("uint8", "float", "palette"):
+        params["block"]["color_type"]["value"] = color_type
+        block = Block(params=params, dimensions=[9, 8, 7])
+        block.add(coords=([0, 0, 0], [5, 3, 2]))
+        block.set_color([1., 0., 0.])
+        block.add(coords=[7, 6, 5])
+        block.remove(coords=[1, 1, 1])
+        write_partitioned(filename, block.as_uniform_grid(), workers=2)
+        assert len(os.listdir(str(tmpdir.join("partition")))) == 2
+
+        # the pieces are readable by VTK
+        reader = vtk.vtkXMLPStructuredGridReader()
+        reader.SetFileName(filename)
+        reader.Update()
+        assert reader.GetOutput().GetNumberOfCells() == block.number_of_cells
+
+        mesh = read_partitioned(filename, workers=2)
+        assert isinstance(mesh, vtk.vtkUniformGrid)
+        assert np.allclose(mesh.GetSpacing(), block.spacing)
+        imported = Block(params=params, dimensions=[9, 8, 7], mesh=mesh)
+        assert imported.color_type == color_type
+        ids, colors = block.get_visible_cells()
+        imported_ids, imported_colors = imported.get_visible_cells()
+        assert np.array_equal(imported_ids, ids)
+        assert np.array_equal(imported_colors, colors)
+        if color_type == "palette":
+            assert np.array_equal(imported.palette, block.palette)
+
+    # the stale pieces are removed
+    write_partitioned(filename, block.as_uniform_grid(), workers=1)
+    assert os.listdir(str(tmpdir.join("partition"))) == ["partition_0.vts"]
+    assert sorted(os.listdir(str(tmpdir))) == ["partition", "partition.pvts"]
+
+    # a cancelled export keeps the previous pieces
+    write_partitioned(filename, block.as_uniform_grid(), workers=2,
+                      task=_CancelledTask())
+    assert os.listdir(str(tmpdir.join("partition"))) == ["partition_0.vts"]
+    assert sorted(os.listdir(str(tmpdir))) == ["partition", "partition.pvts"]
+
+    # a directory that is not made of pieces is kept
+    tmpdir.mkdir("scene").join("notes.txt").write("")
+    with pytest.raises(ValueError, match="not a directory of pieces"):
+        write_partitioned(str(tmpdir.join("scene.pvts")),
+                          block.as_uniform_grid())
+    assert os.listdir(str(tmpdir.join("scene"))) == ["notes.txt"]
+    assert not tmpdir.join("scene.pvts").exists()
+
+
+class _CancelledTask(object):
+    cancelled = True
+
+    def set_progress(self, value):
+        pass
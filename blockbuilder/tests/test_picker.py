@@ -0,0 +1,53 @@
+import numpy as np
+import vtk
+from blockbuilder.params import rcParams
+from blockbuilder.element import ElementId
+from blockbuilder.grid import Grid
+from blockbuilder.intersection import Intersection
+from blockbuilder.picker import GridPicker
+
+
+def test_grid_picker():
+    grid = Grid(rcParams, [8, 6, 5])
+    grid.translate([0, 0, 2])
+    mapper = vtk.vtkDataSetMapper()
+    mapper.SetInputData(grid.mesh)
+    grid.actor = vtk.vtkActor()
+    grid.actor.SetMapper(mapper)
+    grid.actor.element_id = grid.element_id
+    renderer = vtk.vtkRenderer()
+    renderer.AddActor(grid.actor)
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(True)
+    render_window.AddRenderer(renderer)
+    render_window.SetSize(300, 200)
+    camera = renderer.GetActiveCamera()
+    camera.SetPosition(-5, -8, 15)
+    camera.SetFocalPoint(3, 2, 0)
+    camera.SetViewUp(0, 0, 1)
+    renderer.ResetCameraClippingRange()
+
+    picked = list()
+    picker = GridPicker()
+    picker.AddObserver(vtk.vtkCommand.EndPickEvent,
+                       lambda picker, event: picked.append(event))
+    # no grid, no pick
+    assert picker.Pick(150, 100, 0, renderer) == 0
+    assert picker.GetCellId() == -1
+    assert picked == ["EndPickEvent"]
+    picker.grid = grid
+
+    # same picks as vtkCellPicker
+    cell_picker = vtk.vtkCellPicker()
+    for x in range(0, 300, 10):
+        for y in range(0, 200, 10):
+            cell_picker.Pick(x, y, 0, renderer)
+            picker.Pick(x, y, 0, renderer)
+            assert picker.GetCellId() == cell_picker.GetCellId()
+            intersection = Intersection(picker)
+            assert intersection.exist() == (picker.GetCellId() != -1)
+            if intersection.exist():
+                assert intersection.element(ElementId.GRID)
+                assert np.allclose(intersection.point(ElementId.GRID),
+                                   cell_picker.GetPickPosition())
+    assert len(picked) == 1 + 30 * 20
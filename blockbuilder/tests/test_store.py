@@ -0,0 +1,51 @@
+import copy
+import numpy as np
+import pytest
+from blockbuilder.params import rcParams
+from blockbuilder.block import Block
+from blockbuilder.store import VersionStore
+
+
+def test_version_store(tmpdir):
+    params = copy.deepcopy(rcParams)
+    params["block"]["chunk_size"] = 4
+    store = VersionStore(str(tmpdir.join("versions")))
+    assert store.get_versions() == []
+    for storage in ("implicit", "sparse"):
+        for color_type in ("uint8", "palette"):
+            params["block"]["storage"]["value"] = storage
+            params["block"]["color_type"]["value"] = color_type
+            block = Block(params=params, dimensions=[17, 9, 5])
+            # the identical chunks are stored once
+            block.add(coords=([0, 0, 0], [15, 7, 3]))
+            first_version = store.save(block)
+            manifest = store.load(first_version)
+            assert len(manifest["chunks"]) == 8
+            assert len(set(key for *_, key in manifest["chunks"])) == 1
+            ids, colors = block.get_visible_cells()
+
+            # only the modified chunk is new
+            block.set_color([1., 0., 0.])
+            block.add(coords=[5, 5, 1])
+            second_version = store.save(block)
+            second_manifest = store.load(second_version)
+            assert len(set(key for *_, key in second_manifest["chunks"]) -
+                       set(key for *_, key in manifest["chunks"])) == 1
+            assert store.get_versions()[-2:] == [first_version,
+                                                 second_version]
+
+            store.checkout(first_version, block)
+            checkout_ids, checkout_colors = block.get_visible_cells()
+            order = np.argsort(checkout_ids)
+            assert np.array_equal(checkout_ids[order], np.sort(ids))
+            assert np.array_equal(checkout_colors[order],
+                                  colors[np.argsort(ids)])
+            assert not block.undo()
+            store.checkout(second_version, block)
+            assert block.is_visible([5, 5, 1])
+
+    with pytest.raises(ValueError, match="no version"):
+        store.load("missing")
+    block = Block(params=params, dimensions=[9, 9, 9])
+    with pytest.raises(ValueError, match="match"):
+        store.checkout(first_version, block)
@@ -0,0 +1,74 @@
+import numpy as np
+import vtk
+from blockbuilder.surface import extract_surface, set_quads
+
+
+def test_surface():
+    filled = np.zeros((4, 4, 5), dtype=bool)
+    colors = np.zeros((2, 2, 3, 3), dtype=np.uint8)
+    points, _, face_colors = extract_surface(filled, colors)
+    assert points.shape == (0, 3)
+    assert len(face_colors) == 0
+
+    # two neighbor blocks share an interior face
+    filled[1, 1, 1:3] = True
+    colors[0, 0, 0] = (255, 0, 0)
+    colors[0, 0, 1] = (0, 255, 0)
+    points, _, face_colors = extract_surface(filled, colors)
+    assert points.shape == (10 * 4, 3)
+    assert np.array_equal(points.min(axis=0), (0, 0, 0))
+    assert np.array_equal(points.max(axis=0), (2, 1, 1))
+    assert np.count_nonzero(face_colors[:, 0] == 255) == 5
+    assert np.count_nonzero(face_colors[:, 1] == 255) == 5
+
+    # the padding hides the faces shared with the neighbors
+    filled[1, 1, 0] = True
+    points, _, face_colors = extract_surface(filled, colors)
+    assert len(face_colors) == 9
+
+    mesh = vtk.vtkPolyData()
+    set_quads(mesh, points, "color", face_colors)
+    assert mesh.GetNumberOfCells() == 9
+    assert mesh.GetNumberOfPoints() == 9 * 4
+    assert mesh.GetCellType(0) == vtk.VTK_QUAD
+    # the faces are oriented outward
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputData(mesh)
+    normals.ComputeCellNormalsOn()
+    normals.SplittingOff()
+    normals.ConsistencyOff()
+    normals.AutoOrientNormalsOff()
+    normals.Update()
+    cell_normals = normals.GetOutput().GetCellData().GetNormals()
+    centers = points.reshape(-1, 4, 3).mean(axis=1) - (1, .5, .5)
+    for cell_id in range(mesh.GetNumberOfCells()):
+        normal = np.asarray(cell_normals.GetTuple3(cell_id))
+        assert np.dot(normal, centers[cell_id]) > 0
+
+
+def test_surface_greedy():
+    filled = np.zeros((5, 6, 6), dtype=bool)
+    colors = np.zeros((3, 4, 4), dtype=np.uint16)
+    filled[1:-1, 1:-1, 1:-1] = True
+    points, tcoords, face_colors = extract_surface(filled, colors,
+                                                   greedy=True)
+    # one rectangle per side of the box
+    assert len(face_colors) == 6
+    assert np.array_equal(points.min(axis=0), (0, 0, 0))
+    assert np.array_equal(points.max(axis=0), (4, 4, 3))
+    # the texture coordinates count the cells of the rectangles
+    areas = tcoords.reshape(-1, 4, 2).max(axis=1).prod(axis=1)
+    assert sorted(areas) == [12, 12, 12, 12, 16, 16]
+
+    # the colors are not merged
+    colors[0, 0, 0] = 1
+    colors[2, :2, :] = 2
+    points, tcoords, face_colors = extract_surface(filled, colors,
+                                                   greedy=True)
+    _, _, unit_colors = extract_surface(filled, colors)
+    assert np.array_equal(np.unique(face_colors), [0, 1, 2])
+    areas = tcoords.reshape(-1, 4, 2).max(axis=1).prod(axis=1)
+    assert areas.sum() == len(unit_colors)
+    for color in range(3):
+        assert areas[face_colors == color].sum() == \
+            np.count_nonzero(unit_colors == color)
@@ -0,0 +1,45 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import vtk
+from blockbuilder.task import Task
+
+
+def test_task():
+    def _function(task, value):
+        task.set_progress(2.)
+        return value
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        task = Task(executor, _function, 3)
+        assert task.result() == 3
+        assert task.done()
+        assert task.progress == 1.
+
+        # the observed algorithms report their progress
+        source = vtk.vtkSphereSource()
+        task = Task(executor, lambda task: task.observe(source) or
+                    source.Update())
+        task.result()
+        assert task.progress == 1.
+
+        task = Task(executor, _function, 3)
+        task.cancel()
+        assert task.result() is None
+
+        # the cancellation aborts the observed algorithms
+        source = vtk.vtkSphereSource()
+        observed = threading.Event()
+        cancelled = threading.Event()
+
+        def _observe(task):
+            task.observe(source)
+            observed.set()
+            cancelled.wait()
+
+        task = Task(executor, _observe)
+        observed.wait()
+        assert source.GetAbortExecute() == 0
+        task.cancel()
+        assert source.GetAbortExecute() == 1
+        cancelled.set()
+        assert task.result() is None
@@ -75,6 +75,12 @@ def get_mesh_cell_array(mesh, array_name):
     return cell_data.GetArray(array_name)
 
 
+def get_mesh_ghost_array(mesh):
+    """Retrieve the cell ghost array of the mesh, allocate it if needed."""
+    mesh.AllocateCellGhostArray()
+    return mesh.GetCellGhostArray()
+
+
 def get_poly_data():
     """Create a vtkPolyData."""
     mesh = vtk.vtkSphereSource()
@@ -84,45 +90,80 @@ def get_poly_data():
 
 
 def get_uniform_grid(dimensions=(2, 2, 2), origin=(0., 0., 0.),
-                     spacing=(1., 1., 1.)):
+                     spacing=(1., 1., 1.), array_name="color",
+                     color=(1., 1., 1.), dtype=np.float64):
     """Create a vtkUniformGrid."""
+    dimensions = np.asarray(dimensions)
     mesh = vtk.vtkUniformGrid()
     mesh.Initialize()
     mesh.SetDimensions(*dimensions)
     mesh.SetOrigin(*origin)
     mesh.SetSpacing(*spacing)
+    _add_color_array(mesh, dimensions, array_name, color, dtype)
     return mesh
 
 
 def get_structured_grid(dimensions=(2, 2, 2), origin=(0., 0., 0.),
                         spacing=(1., 1., 1.), array_name="color",
-                        color=(1., 1., 1.)):
+                        color=(1., 1., 1.), dtype=np.float64):
     """Create a vtkStructuredGrid."""
+    from vtk.util.numpy_support import numpy_to_vtk
     dimensions = np.asarray(dimensions)
     mesh = vtk.vtkStructuredGrid()
     mesh.SetDimensions(*dimensions)
 
-    counter = 0
-    number_of_points = np.prod(dimensions)
-    points = vtk.vtkPoints()
-    points.SetNumberOfPoints(number_of_points)
-    for k in range(dimensions[2]):
-        for j in range(dimensions[1]):
-            for i in range(dimensions[0]):
-                point = origin + np.multiply([i, j, k], spacing)
-                points.SetPoint(counter, point)
-                counter += 1
-    mesh.SetPoints(points)
+    # the points are stored with x varying fastest, then y, then z
+    axes = [origin[i] + np.arange(dimensions[i]) * spacing[i]
+            for i in range(3)]
+    points = np.empty(tuple(dimensions[::-1]) + (3,))
+    points[..., 0] = axes[0][np.newaxis, np.newaxis, :]
+    points[..., 1] = axes[1][np.newaxis, :, np.newaxis]
+    points[..., 2] = axes[2][:, np.newaxis, np.newaxis]
+    vtk_points = vtk.vtkPoints()
+    # the VTK array keeps a reference to the NumPy array, no copy is made
+    vtk_points.SetData(numpy_to_vtk(points.reshape(-1, 3)))
+    mesh.SetPoints(vtk_points)
+    _add_color_array(mesh, dimensions, array_name, color, dtype)
+    return mesh
+
+
+def structured_grid_to_uniform_grid(mesh, spacing=(1., 1., 1.)):
+    """Convert a vtkStructuredGrid with uniform spacing."""
+    grid = vtk.vtkUniformGrid()
+    grid.Initialize()
+    grid.SetDimensions(mesh.GetDimensions())
+    grid.SetOrigin(mesh.GetPoint(0))
+    grid.SetSpacing(*spacing)
+    grid.GetCellData().ShallowCopy(mesh.GetCellData())
+    grid.GetFieldData().ShallowCopy(mesh.GetFieldData())
+    return grid
 
+
+def uniform_grid_to_structured_grid(mesh):
+    """Convert a vtkImageData into a vtkStructuredGrid."""
+    image_filter = vtk.vtkImageDataToPointSet()
+    image_filter.SetInputData(mesh)
+    image_filter.Update()
+    return image_filter.GetOutput()
+
+
+def image_data_to_uniform_grid(mesh):
+    """Convert a vtkImageData into a vtkUniformGrid."""
+    grid = vtk.vtkUniformGrid()
+    grid.ShallowCopy(mesh)
+    return grid
+
+
+def _add_color_array(mesh, dimensions, array_name, color, dtype):
     number_of_cells = np.prod(dimensions - 1)
-    array = np.tile(color, (number_of_cells, 1))
+    array = np.empty((number_of_cells, len(color)), dtype=dtype)
+    array[:] = color
     add_mesh_cell_array(
         mesh=mesh,
         array_name=array_name,
         array=array,
     )
     mesh.Modified()
-    return mesh
 
 
 def _rgb2str(color, is_int=False):
@@ -48,9 +48,9 @@ def package_tree(pkgroot):
 # Adapted from Spyder
 with io.open('README.md', encoding='utf-8') as f:
     LONG_DESCRIPTION = f.read()
-SCRIPTS = ['blockbuilder']
+SCRIPTS = ['blockbuilder', 'blockbuilder-batch']
 if os.name == 'nt':
-    SCRIPTS += ['blockbuilder.bat']
+    SCRIPTS += ['blockbuilder.bat', 'blockbuilder-batch.bat']
 
 
 setup_args = dict(